@@ -15,6 +15,7 @@ COMMON_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # 'django_cleanup.apps.CleanupConfig'
 ]
 
@@ -2,10 +2,14 @@ import logging
 
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
 from django.http import JsonResponse
+from django.utils.functional import cached_property
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import exception_handler
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.settings import api_settings
 from django.conf import settings
 
 
@@ -60,3 +64,64 @@ class PaginationMiddleware(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'size'
     max_page_size = 100
+
+
+def get_estimated_count(queryset):
+    query = queryset.query
+    if (query.where or query.distinct or query.combinator
+            or query.low_mark or query.high_mark is not None):
+        return None
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    is_approximate = False
+
+    @cached_property
+    def count(self):
+        estimate = get_estimated_count(self.object_list)
+        if (estimate is not None
+                and estimate >= settings.ESTIMATED_COUNT_THRESHOLD):
+            self.is_approximate = True
+            return estimate
+        return super().count
+
+
+class EstimatedCountPaginationMiddleware(PaginationMiddleware):
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_approximate'] = (
+            self.page.paginator.is_approximate)
+        return response
+
+
+class CursorPaginationMiddleware(CursorPagination):
+    page_size = 10
+    page_size_query_param = 'size'
+    max_page_size = 100
+    ordering = '-id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Cursors page on the ordering fields, which would replace the
+        # relevance order of a search with id order.
+        if request.query_params.get(api_settings.SEARCH_PARAM, '').strip():
+            raise ValidationError({
+                'pagination': [
+                    'cursor pagination cannot be combined with search.'
+                ]
+            })
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('ordering', None):
+            return super().get_ordering(request, queryset, view)
+        return (self.ordering, )
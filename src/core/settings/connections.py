@@ -17,6 +17,13 @@ REDIS_URL = f"redis://{REDIS_HOST}:6379/{CHANNEL}"
 
 CELERY_BROKER_URL = REDIS_URL
 CELERY_BROKER = REDIS_URL
+# CPU bound image encoding runs on its own prefork worker pool, see the
+# media worker in docker-compose.yml.
+CELERY_ROUTES = {'core.tasks.process_media_job': {'queue': 'media'}}
+# Claimed media jobs that are not acknowledged within the timeout are
+# requeued, and marked failed after the last attempt.
+MEDIA_JOB_TIMEOUT_SECONDS = 60 * 10
+MEDIA_JOB_MAX_ATTEMPTS = 3
 
 CACHES = {
     "default": {
@@ -32,6 +39,13 @@ CACHES = {
     }
 }
 CACHE_MIDDLEWARE_SECONDS = 60
+CATALOG_CACHE_SECONDS = 60 * 15
+AUTOCOMPLETE_CACHE_SECONDS = 60 * 5
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_MAX_SIZE = 20
+PRODUCT_FACET_PRICE_BUCKETS = '0,500,1000,2500,5000,10000'
+IDEMPOTENCY_KEY_SECONDS = 60 * 60 * 24
+IDEMPOTENCY_LOCK_SECONDS = 30
 DATABASE_HOST = "bepasal-db" if DOCKER else "127.0.0.1"
 
 DATABASES = {
@@ -9,7 +9,8 @@ APPEND_SLASH = False
 
 ALLOWED_HOSTS = ["*"]
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100214400
-FILE_UPLOAD_MAX_MEMORY_SIZE = 100214400
+# Multipart files above this size are spooled to a temporary file on disk.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 100214400
 
 INSTALLED_APPS = []
@@ -109,6 +110,7 @@ CORS_ALLOW_HEADERS = [
     "authorization",
     "content-type",
     "dnt",
+    "idempotency-key",
     "origin",
     "user-agent",
     "x-csrftoken",
@@ -117,6 +119,9 @@ CORS_ALLOW_HEADERS = [
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media/")
 MEDIA_URL = "/media/"
+IMAGE_MAX_WIDTH = 600
+IMAGE_MAX_SIZE_KB = 120
+IMAGE_DERIVATIVE_WIDTHS = [160, 320, 480]
 
 mimetypes.add_type("application/javascript", ".js", True)
 mimetypes.add_type("text/css", ".css", True)
@@ -148,7 +153,8 @@ LOGGING = {
 }
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100214400
-FILE_UPLOAD_MAX_MEMORY_SIZE = 100214400
+# Multipart files above this size are spooled to a temporary file on disk.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 100214400
 
 NEXTJS_SETTINGS = {
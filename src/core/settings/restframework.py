@@ -37,3 +37,5 @@ REST_FRAMEWORK = {
     #     'user': '200/minute'
     # }
 }
+
+ESTIMATED_COUNT_THRESHOLD = 100000
@@ -2,7 +2,9 @@ from os import makedirs, path
 
 import openpyxl
 import pandas as pd
+from celery.signals import worker_ready
 from django.apps import apps
+from django.conf import settings
 from django.core.mail import send_mail
 from django.db import models
 from django.utils.text import slugify
@@ -116,3 +118,17 @@ def export_data_task(document_id, ids):
     except Exception as e:
         document.status = f'Error {e}'
         document.save()
+
+
+@celery_app.task
+def process_media_job():
+    from core.utils.media import process_next_media_job
+    process_next_media_job()
+
+
+@worker_ready.connect
+def handle_worker_ready(*args, **kwargs):
+    # Jobs claimed by a worker that died are requeued once their claim
+    # expires, even if no new upload wakes a worker up.
+    process_media_job.apply_async(
+        countdown=settings.MEDIA_JOB_TIMEOUT_SECONDS)
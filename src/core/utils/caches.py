@@ -0,0 +1,150 @@
+import hashlib
+import json
+from contextlib import suppress
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from redis.exceptions import LockError
+from rest_framework import status
+from rest_framework.response import Response
+
+CACHE_VERSION_KEY = 'catalog_cache_version_{}'
+CACHE_HITS_KEY = 'catalog_cache_hits'
+CACHE_MISSES_KEY = 'catalog_cache_misses'
+IDEMPOTENCY_KEY = 'idempotency_{}_{}'
+
+
+def incr_cache_key(key, timeout=None):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout)
+        return 1
+
+
+def get_cache_versions(namespaces):
+    keys = [CACHE_VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    return '.'.join(str(versions.get(key, 0)) for key in keys)
+
+
+def invalidate_cache_namespaces(*namespaces):
+
+    def bump_versions():
+        for namespace in namespaces:
+            incr_cache_key(CACHE_VERSION_KEY.format(namespace))
+
+    transaction.on_commit(bump_versions)
+
+
+def get_cache_stats():
+    stats = cache.get_many([CACHE_HITS_KEY, CACHE_MISSES_KEY])
+    hits = stats.get(CACHE_HITS_KEY, 0)
+    misses = stats.get(CACHE_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0
+    }
+
+
+def idempotent(view):
+    '''
+    Replays the stored first response for requests that repeat an
+    Idempotency-Key header. Concurrent duplicates wait on a lock and then
+    get the replay instead of being processed twice.
+    '''
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        if not (idempotency_key := request.headers.get('Idempotency-Key')):
+            return view(self, request, *args, **kwargs)
+        user = request.user.id if request.user.is_authenticated else 'anon'
+        key = IDEMPOTENCY_KEY.format(
+            user,
+            hashlib.md5(
+                f'{request.method}:{request.path}:{idempotency_key}'.encode()
+            ).hexdigest())
+        fingerprint = hashlib.md5(
+            json.dumps(request.data, sort_keys=True,
+                       default=str).encode()).hexdigest()
+
+        def replay(stored):
+            if stored['fingerprint'] != fingerprint:
+                return Response(
+                    {
+                        'status': False,
+                        'error': 'Idempotency-Key was already used with a '
+                        'different request.'
+                    },
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            response = Response(stored['data'], status=stored['status'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        if (stored := cache.get(key)) is not None:
+            return replay(stored)
+        lock_seconds = settings.IDEMPOTENCY_LOCK_SECONDS
+        lock = cache.lock(f'{key}_lock',
+                          timeout=lock_seconds,
+                          blocking_timeout=lock_seconds)
+        if not lock.acquire():
+            return Response(
+                {
+                    'status': False,
+                    'error': 'A request with this Idempotency-Key is still '
+                    'being processed.'
+                },
+                status=status.HTTP_409_CONFLICT)
+        try:
+            if (stored := cache.get(key)) is not None:
+                return replay(stored)
+            response = view(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(
+                    key, {
+                        'status': response.status_code,
+                        'data': response.data,
+                        'fingerprint': fingerprint
+                    }, settings.IDEMPOTENCY_KEY_SECONDS)
+            return response
+        finally:
+            # A view that outlived the lock has still done its work; losing
+            # the lock must not turn its response into an error.
+            with suppress(LockError):
+                lock.release()
+
+    return wrapper
+
+
+class CachedResponseMixin:
+    cache_namespaces = []
+    cache_timeout = settings.CATALOG_CACHE_SECONDS
+
+    def get_cache_key(self, request):
+        role = 'staff' if request.user.is_staff else 'anonymous'
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        versions = get_cache_versions(self.cache_namespaces)
+        return f'catalog_response_{self.basename}_{role}_{versions}_{path}'
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        if (data := cache.get(key)) is not None:
+            incr_cache_key(CACHE_HITS_KEY)
+            return Response(data)
+        incr_cache_key(CACHE_MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+        return response
+
+    def get_list_response(self, request, *args, **kwargs):
+        return self.get_cached_response(super().get_list_response, request,
+                                        *args, **kwargs)
+
+    def get_retrieve_response(self, request, *args, **kwargs):
+        return self.get_cached_response(super().get_retrieve_response,
+                                        request, *args, **kwargs)
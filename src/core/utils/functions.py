@@ -1,10 +1,11 @@
-import os
-import random
-import string
 from functools import wraps
+from io import BytesIO
+from os import path
 
 import dateutil.parser
+from django.conf import settings
 from django.core.cache import cache
+from django.core.files.base import ContentFile
 from django.db import connection
 from django.db.transaction import atomic
 from PIL import Image
@@ -148,27 +149,84 @@ def export_data(model, ids, document_name=None):
     return document.id
 
 
-def optimize_image(image, output_image_path):
-    max_size_kb = 120
-    desired_ppi = 72
-    max_width = 600
+IMAGE_STATUS_CHOICES = (
+    ('pending', 'pending'),
+    ('processing', 'processing'),
+    ('done', 'done'),
+    ('failed', 'failed'),
+)
+
+
+def encode_webp(image, quality):
+    buffer = BytesIO()
+    image.save(buffer, 'webp', quality=quality)
+    return buffer
+
+
+def encode_webp_within_budget(image, max_bytes, min_quality=60, step=5):
+    """
+    Returns the (buffer, quality) pair of the highest quality encoding that
+    fits in max_bytes, binary searching the quality steps instead of trying
+    them one by one.
+    """
+    buffer = encode_webp(image, 100)
+    if buffer.tell() <= max_bytes:
+        return buffer, 100
+    qualities = list(range(min_quality, 100, step))
+    best, best_quality = None, min_quality
+    low, high = 0, len(qualities) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = encode_webp(image, qualities[middle])
+        if candidate.tell() <= max_bytes:
+            best, best_quality = candidate, qualities[middle]
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best or encode_webp(image, min_quality), best_quality
+
+
+def optimize_image(image,
+                   max_size_kb=settings.IMAGE_MAX_SIZE_KB,
+                   max_width=settings.IMAGE_MAX_WIDTH):
     if max(image.size) > max_width:
-        ratio = max_width / image.size[1]
+        ratio = max_width / max(image.size)
         new_size = tuple(int(x * ratio) for x in image.size)
         image = image.resize(new_size, Image.Resampling.LANCZOS)
-    width, height = image.size
-    width_inch = width / desired_ppi
-    height_inch = height / desired_ppi
-    image = image.resize((int(width_inch * 72), int(height_inch * 72)),
-                         Image.Resampling.LANCZOS)
-    characters = string.ascii_letters
-    temp_path = ''.join(random.choice(characters) for _ in range(10))
-    quality = 100
-    image.save(temp_path, 'webp', quality=quality)
-    temp_size = os.path.getsize(temp_path)
-    while temp_size > (max_size_kb * 1024) and quality > 60:
-        quality -= 5
-        image.save(temp_path, 'webp', quality=quality)
-        temp_size = os.path.getsize(temp_path)
-    os.rename(temp_path, output_image_path)
-    return output_image_path
+    buffer, _ = encode_webp_within_budget(image, max_size_kb * 1024)
+    buffer.seek(0)
+    return buffer
+
+
+def generate_image_derivatives(image, name, storage, max_width):
+    """
+    Saves a WebP rendition of image for every configured width below
+    max_width as `<stem>_<width>w.webp` next to the stored file name and
+    returns the {width: name} map. Existing files are never replaced, the
+    storage picks a free name instead.
+    """
+    stem = path.splitext(name)[0]
+    srcset = {}
+    for width in settings.IMAGE_DERIVATIVE_WIDTHS:
+        if width >= min(max_width, image.width):
+            continue
+        derivative = image.resize(
+            (width, max(round(image.height * width / image.width), 1)),
+            Image.Resampling.LANCZOS)
+        # Scale the byte budget with the pixel count, keeping a floor so
+        # the smallest renditions are not starved of quality.
+        max_bytes = max(
+            settings.IMAGE_MAX_SIZE_KB * 1024 *
+            (width / settings.IMAGE_MAX_WIDTH)**2, 8 * 1024)
+        buffer, _ = encode_webp_within_budget(derivative, max_bytes)
+        srcset[str(width)] = storage.save(f'{stem}_{width}w.webp',
+                                          ContentFile(buffer.getvalue()))
+    return srcset
+
+
+def get_srcset_urls(srcset, storage):
+    return {
+        f'{width}w': storage.url(name)
+        for width, name in sorted(srcset.items(),
+                                  key=lambda item: int(item[0]))
+    }
@@ -0,0 +1,328 @@
+import hashlib
+import json
+import time
+from os import path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django_redis import get_redis_connection
+from django_tenants.utils import schema_context
+from PIL import Image
+
+from core.tasks import process_media_job, write_log_file
+from core.utils.functions import generate_image_derivatives, optimize_image
+
+# model label -> image field names processed by the media pipeline
+IMAGE_FIELDS = {}
+
+# Jobs wait in one redis list per tenant. The tenants list is rotated on
+# every pop, so each worker slot serves the next tenant with pending work
+# instead of the oldest job, and a bulk import only delays its own tenant.
+# A popped job is moved to the tenant's processing list and stays there
+# until the worker acknowledges it, so a killed worker does not lose it.
+MEDIA_TENANTS_KEY = 'media_queue_tenants'
+MEDIA_ACTIVE_TENANTS_KEY = 'media_queue_active_tenants'
+MEDIA_JOBS_KEY = 'media_queue_jobs_{}'
+MEDIA_PROCESSING_KEY = 'media_queue_processing_{}'
+MEDIA_CLAIMS_KEY = 'media_queue_claims_{}'
+MEDIA_STATS_KEY = 'media_queue_stats_{}'
+
+
+def register_image_field(model, field_name):
+    fields = IMAGE_FIELDS.setdefault(model._meta.label, [])
+    if field_name in fields:
+        return
+    fields.append(field_name)
+    pre_save.connect(handle_image_pre_save,
+                     sender=model,
+                     dispatch_uid=f'media_pre_save_{model._meta.label}')
+    post_save.connect(handle_image_post_save,
+                      sender=model,
+                      dispatch_uid=f'media_post_save_{model._meta.label}')
+    post_delete.connect(handle_image_post_delete,
+                        sender=model,
+                        dispatch_uid=f'media_post_delete_{model._meta.label}')
+
+
+def handle_image_pre_save(sender, instance, *args, **kwargs):
+    for field_name in IMAGE_FIELDS[sender._meta.label]:
+        mark_image_for_optimization(instance, field_name)
+
+
+def handle_image_post_save(sender, instance, *args, **kwargs):
+    queue_image_optimization(instance)
+
+
+def handle_image_post_delete(sender, instance, *args, **kwargs):
+    for field_name in IMAGE_FIELDS[sender._meta.label]:
+        release_image(getattr(instance, field_name))
+
+
+def get_content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def release_image(image):
+    if image:
+        media_asset = apps.get_model('system', 'MediaAsset')
+        name, storage = image.name, image.storage
+        transaction.on_commit(lambda: media_asset.release(name, storage))
+
+
+def mark_image_for_optimization(instance, field_name):
+    image = getattr(instance, field_name)
+    if image and image._committed:
+        return
+    if not instance._state.adding and (previous := type(
+            instance).objects.filter(pk=instance.pk).only(field_name).first()):
+        previous_image = getattr(previous, field_name)
+        if previous_image.name != getattr(image, 'name', None):
+            release_image(previous_image)
+    if not image:
+        return
+    srcset_field = f'{field_name}_srcset'
+    content_hash = get_content_hash(image)
+    # Identical bytes were already stored and optimised: point the field at
+    # that file instead of storing and processing the upload again.
+    if asset := apps.get_model('system', 'MediaAsset').acquire(content_hash):
+        setattr(instance, field_name, asset.name)
+        setattr(instance, f'{field_name}_status', 'done')
+        if hasattr(instance, srcset_field):
+            setattr(instance, srcset_field, asset.srcset)
+        return
+    setattr(instance, f'{field_name}_status', 'pending')
+    if hasattr(instance, srcset_field):
+        setattr(instance, srcset_field, {})
+    instance._pending_image_fields = {
+        **getattr(instance, '_pending_image_fields', {}),
+        field_name: content_hash
+    }
+
+
+def queue_image_optimization(instance):
+    pending_image_fields = vars(instance).pop('_pending_image_fields', {})
+    schema_name = connection.schema_name
+    for field_name, content_hash in pending_image_fields.items():
+        job = {
+            'model': instance._meta.label,
+            'obj_id': instance.pk,
+            'field_name': field_name,
+            'content_hash': content_hash
+        }
+        transaction.on_commit(
+            lambda job=job: enqueue_media_job(schema_name, job))
+
+
+def enqueue_media_job(schema_name, job, retry=False):
+    redis = get_redis_connection('default')
+    # Retried jobs go to the front, they have waited long enough.
+    push = redis.lpush if retry else redis.rpush
+    push(MEDIA_JOBS_KEY.format(schema_name), json.dumps(job))
+    if redis.sadd(MEDIA_ACTIVE_TENANTS_KEY, schema_name):
+        redis.rpush(MEDIA_TENANTS_KEY, schema_name)
+    process_media_job.delay()
+
+
+def pop_media_job():
+    redis = get_redis_connection('default')
+    for _ in range(redis.llen(MEDIA_TENANTS_KEY)):
+        if (schema_name := redis.rpoplpush(MEDIA_TENANTS_KEY,
+                                           MEDIA_TENANTS_KEY)) is None:
+            return None
+        schema_name = schema_name.decode()
+        jobs_key = MEDIA_JOBS_KEY.format(schema_name)
+        if raw_job := redis.lmove(jobs_key,
+                                  MEDIA_PROCESSING_KEY.format(schema_name),
+                                  'LEFT', 'RIGHT'):
+            redis.hset(MEDIA_CLAIMS_KEY.format(schema_name), raw_job,
+                       time.time())
+            return schema_name, raw_job
+        redis.lrem(MEDIA_TENANTS_KEY, 0, schema_name)
+        redis.srem(MEDIA_ACTIVE_TENANTS_KEY, schema_name)
+        # A job may have been pushed while the tenant was being dropped.
+        if redis.llen(jobs_key) and redis.sadd(MEDIA_ACTIVE_TENANTS_KEY,
+                                               schema_name):
+            redis.rpush(MEDIA_TENANTS_KEY, schema_name)
+    return None
+
+
+def ack_media_job(schema_name, raw_job):
+    redis = get_redis_connection('default')
+    redis.lrem(MEDIA_PROCESSING_KEY.format(schema_name), 1, raw_job)
+    redis.hdel(MEDIA_CLAIMS_KEY.format(schema_name), raw_job)
+
+
+def fail_media_job(schema_name, job):
+    with schema_context(schema_name):
+        apps.get_model(job['model']).objects.filter(id=job['obj_id']).update(
+            **{f"{job['field_name']}_status": 'failed'})
+    get_redis_connection('default').hincrby(
+        MEDIA_STATS_KEY.format(schema_name), 'failed', 1)
+
+
+def requeue_stale_media_jobs():
+    '''
+    Puts back jobs whose worker died before acknowledging them, and gives up
+    on a job after MEDIA_JOB_MAX_ATTEMPTS so an image that kills the worker
+    cannot do so forever.
+    '''
+    redis = get_redis_connection('default')
+    now = time.time()
+    prefix = MEDIA_PROCESSING_KEY.format('')
+    for processing_key in redis.scan_iter(MEDIA_PROCESSING_KEY.format('*')):
+        schema_name = processing_key.decode().removeprefix(prefix)
+        claims_key = MEDIA_CLAIMS_KEY.format(schema_name)
+        for raw_job in redis.lrange(processing_key, 0, -1):
+            if (claimed := redis.hget(claims_key, raw_job)) is None:
+                # Popped but not stamped yet.
+                redis.hsetnx(claims_key, raw_job, now)
+                continue
+            if now - float(claimed) < settings.MEDIA_JOB_TIMEOUT_SECONDS:
+                continue
+            # Another sweeper or the worker itself got there first.
+            if not redis.lrem(processing_key, 1, raw_job):
+                continue
+            redis.hdel(claims_key, raw_job)
+            job = json.loads(raw_job)
+            job['attempts'] = job.get('attempts', 0) + 1
+            if job['attempts'] < settings.MEDIA_JOB_MAX_ATTEMPTS:
+                enqueue_media_job(schema_name, job, retry=True)
+            else:
+                fail_media_job(schema_name, job)
+
+
+def process_next_media_job():
+    requeue_stale_media_jobs()
+    if (popped := pop_media_job()) is None:
+        return
+    schema_name, raw_job = popped
+    job = json.loads(raw_job)
+    job.pop('attempts', None)
+    start = time.perf_counter()
+    try:
+        succeeded = optimize_image_field(schema_name, **job)
+    except Exception:
+        # Left unacknowledged, so the sweep run by this task retries it.
+        process_media_job.apply_async(
+            countdown=settings.MEDIA_JOB_TIMEOUT_SECONDS)
+        raise
+    ack_media_job(schema_name, raw_job)
+    elapsed_ms = int((time.perf_counter() - start) * 1000)
+    redis = get_redis_connection('default')
+    stats_key = MEDIA_STATS_KEY.format(schema_name)
+    redis.hincrby(stats_key, 'processed' if succeeded else 'failed', 1)
+    redis.hincrby(stats_key, 'encode_ms', elapsed_ms)
+    redis.hset(stats_key, 'last_encode_ms', elapsed_ms)
+
+
+def get_media_queue_stats(schema_name):
+    redis = get_redis_connection('default')
+    tenants = [
+        schema.decode() for schema in redis.smembers(MEDIA_ACTIVE_TENANTS_KEY)
+    ]
+    stats = {
+        key.decode(): int(value)
+        for key, value in redis.hgetall(
+            MEDIA_STATS_KEY.format(schema_name)).items()
+    }
+    encoded = stats.get('processed', 0) + stats.get('failed', 0)
+    return {
+        'queue_depth': redis.llen(MEDIA_JOBS_KEY.format(schema_name)),
+        'total_queue_depth': sum(
+            redis.llen(MEDIA_JOBS_KEY.format(tenant)) for tenant in tenants),
+        'active_tenants': len(tenants),
+        'processed': stats.get('processed', 0),
+        'failed': stats.get('failed', 0),
+        'average_encode_ms': (round(stats.get('encode_ms', 0) / encoded, 2)
+                              if encoded else 0),
+        'last_encode_ms': stats.get('last_encode_ms', 0),
+    }
+
+
+def delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def optimize_image_field(schema_name, model, obj_id, field_name,
+                         content_hash):
+    status_field = f'{field_name}_status'
+    srcset_field = f'{field_name}_srcset'
+    with schema_context(schema_name):
+        media_asset = apps.get_model('system', 'MediaAsset')
+        model = apps.get_model(model)
+        queryset = model.objects.filter(id=obj_id)
+        if not (obj := queryset.first()) or not (image := getattr(
+                obj, field_name)):
+            return True
+        original_name = image.name
+        stale_names = [original_name]
+        # Files written by this job; only these may be deleted if its result
+        # is discarded, whatever else happens to share their directory.
+        created_names = []
+        queryset.update(**{status_field: 'processing'})
+        try:
+            with image.open('rb') as image_file:
+                source = Image.open(image_file)
+                source.load()
+            optimized_image = optimize_image(source)
+            width = Image.open(optimized_image).width
+            name = image.storage.save(
+                f'{path.splitext(original_name)[0]}.webp',
+                ContentFile(optimized_image.getvalue()))
+            created_names.append(name)
+            srcset = generate_image_derivatives(source, name, image.storage,
+                                                width)
+            created_names += srcset.values()
+            srcset[str(width)] = name
+            with transaction.atomic():
+                obj = queryset.select_for_update().first()
+                # A newer upload replaced the file while this one was being
+                # processed; its own job will take care of it.
+                if obj is None or getattr(obj,
+                                          field_name).name != original_name:
+                    stale_names += created_names
+                    transaction.on_commit(
+                        lambda: delete_files(image.storage, stale_names))
+                    return True
+                setattr(obj, field_name, name)
+                asset, created = media_asset.objects.get_or_create(
+                    content_hash=content_hash,
+                    defaults={
+                        'name': name,
+                        'srcset': srcset
+                    })
+                if not created:
+                    # A duplicate upload finished first, share its files.
+                    stale_names += created_names
+                    setattr(obj, field_name, asset.name)
+                media_asset.objects.filter(id=asset.id).update(
+                    references=F('references') + 1)
+                setattr(obj, status_field, 'done')
+                update_fields = [field_name, status_field]
+                if any(field.name == srcset_field
+                       for field in model._meta.fields):
+                    setattr(obj, srcset_field, asset.srcset)
+                    update_fields.append(srcset_field)
+                if any(field.name == 'updated_at'
+                       for field in model._meta.fields):
+                    update_fields.append('updated_at')
+                obj.save(update_fields=update_fields)
+                transaction.on_commit(
+                    lambda: delete_files(image.storage, stale_names))
+            return True
+        except Exception as exp:
+            delete_files(image.storage, created_names)
+            queryset.update(**{status_field: 'failed'})
+            write_log_file.delay(
+                'images', f'{model.__name__} {obj_id} {field_name}: {exp}',
+                True)
+            return False
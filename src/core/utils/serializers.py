@@ -1,21 +1,45 @@
 import base64
 import uuid
 from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from rest_framework import serializers
 from rest_framework.exceptions import APIException
 
+from core.utils.functions import get_srcset_urls
+
+
+BASE64_DECODE_CHUNK_SIZE = 64 * 1024 * 4
+
+
+def decode_base64_file(data, name, content_type):
+    # Decode into a temporary file chunk by chunk so the decoded bytes never
+    # sit in memory next to the encoded string.
+    if any(character in data for character in '\r\n '):
+        data = ''.join(data.split())
+    upload = TemporaryUploadedFile(name, content_type, None, None)
+    for start in range(0, len(data), BASE64_DECODE_CHUNK_SIZE):
+        upload.write(
+            base64.b64decode(data[start:start + BASE64_DECODE_CHUNK_SIZE]))
+    upload.size = upload.tell()
+    upload.seek(0)
+    return upload
+
 
 class Base64ImageField(serializers.ImageField):
+    '''
+    Accepts a multipart file upload, which Django streams to disk in chunks,
+    or a `data:image/<ext>;base64,...` string as a fallback.
+    '''
 
     def to_internal_value(self, data):
         try:
-            if data.startswith('data:image'):
+            if isinstance(data, str) and data.startswith('data:image'):
                 # base64 encoded image - decode
                 format_, imgstr = data.split(';base64,')
                 ext = format_.split('/')[-1]
                 name = uuid.uuid4()
-                data = ContentFile(base64.b64decode(imgstr),
-                                   name=f'{name}.{ext}')
+                data = decode_base64_file(imgstr, f'{name}.{ext}',
+                                          format_.split(':')[-1])
         except Exception as exp:
             raise APIException(f'Invalid Base64 format. {exp}') from exp
         return super().to_internal_value(data)
@@ -41,3 +65,25 @@ class Base64FileField(serializers.FileField):
         except Exception as exp:
             raise APIException(f'Invalid Base64 format. {exp}') from exp
         return super().to_internal_value(data)
+
+
+class ImageSrcsetField(serializers.Field):
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['read_only'] = True
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        if not image:
+            return {}
+        srcset = get_srcset_urls(
+            getattr(instance, f'{self.image_field}_srcset'), image.storage)
+        if request := self.context.get('request', None):
+            return {
+                width: request.build_absolute_uri(url)
+                for width, url in srcset.items()
+            }
+        return srcset
@@ -1,11 +1,20 @@
 from rest_framework import serializers
 
 
-from ecommerce.models.ecom import QA, Cart,  Review, WishList
+from core.utils.serializers import Base64ImageField
+from ecommerce.models.ecom import QA, Cart, Review, ReviewImage, WishList
 from system.api.serializers.product import (
     ProductMiniSerializer, ProductVariationSerializer)
 
 
+class ReviewImageSerializer(serializers.ModelSerializer):
+    image = Base64ImageField()
+
+    class Meta:
+        model = ReviewImage
+        fields = '__all__'
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -2,15 +2,19 @@
 from django.db import transaction
 from rest_framework import status
 from rest_framework.decorators import action, api_view
+from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from core.middlewares import EstimatedCountPaginationMiddleware
 from core.utils.permissions import IsOwnerOrAdmin, IsOwnerOrReadOnly
 from core.utils.viewsets import DefaultViewSet
 from ecommerce.api.serializers.site import (CartSerializer, QASerializer,
+                                            ReviewImageSerializer,
                                             ReviewSerializer,
                                             WishListSerializer)
-from ecommerce.models.ecom import QA, Cart, Review, WishList
+from ecommerce.models.ecom import QA, Cart, Review, ReviewImage, WishList
 from system.models.product import ProductVariation
 
 
@@ -22,6 +26,7 @@ class ReviewAPI(DefaultViewSet):
     search_fields = ['user', 'product__name']
     queryset = Review.objects.filter().order_by('-id')
     permission_classes = [IsOwnerOrReadOnly]
+    pagination_class = EstimatedCountPaginationMiddleware
 
     def get_queryset(self):
         product_id = self.request.GET.get('product', None)
@@ -36,6 +41,16 @@ class ReviewAPI(DefaultViewSet):
         return self.queryset.none()
 
 
+class ReviewImageAPI(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
+    '''
+    Upload as multipart `image` or a base64 data url, then pass the returned
+    id in the review's `images`.
+    '''
+    serializer_class = ReviewImageSerializer
+    queryset = ReviewImage.objects.filter().order_by('-id')
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+
 def get_initial_load(product_slug):
     reviews = Review.objects.filter(
         product__slug=product_slug).order_by('-id')[:5]
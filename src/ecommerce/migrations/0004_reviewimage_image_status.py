@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviewimage',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('done', 'done'), ('failed', 'failed')], default='done', editable=False, max_length=25),
+        ),
+    ]
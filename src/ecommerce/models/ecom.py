@@ -1,13 +1,13 @@
-import os
-from PIL import Image
-from core.utils.functions import default_json, optimize_image
-import contextlib
+from core.utils.caches import invalidate_cache_namespaces
+from core.utils.functions import IMAGE_STATUS_CHOICES, default_json
+from core.utils.media import register_image_field
 from django.core.validators import MaxValueValidator
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from system.models.product import Product, ProductVariation
+from system.models.product import (Product, ProductVariation,
+                                   refresh_product_cards)
 from users.models.users import UserBase
 
 
@@ -25,27 +25,13 @@ class Cart(models.Model):
 class ReviewImage(models.Model):
     image = models.ImageField(upload_to='review_images',
                                         blank=True, null=True)
+    image_status = models.CharField(max_length=25,
+                                    choices=IMAGE_STATUS_CHOICES,
+                                    default='done',
+                                    editable=False)
 
 
-@receiver(pre_save, sender=ReviewImage)
-def handle_product_image_pre_save(sender, instance, *args, **kwargs):
-    if instance.image:
-        with contextlib.suppress(Exception):
-            image_name = instance.image.name
-            if not image_name.endswith('.webp'):
-                if "/" in instance.image.name:
-                    image_name = instance.image.name.split('/')[-1]
-                temp_output_image_path = f"temp_{image_name}"
-                with instance.image.open("rb") as image_file:
-                    image = Image.open(image_file)
-                    optimized_image_path = optimize_image(
-                        image, temp_output_image_path)
-                with open(optimized_image_path, "rb") as optimized_image_file:
-                    instance.image.save(image_name.replace(
-                        image_name.split('.')[-1], 'webp'),
-                        optimized_image_file,
-                        save=False)
-                os.remove(optimized_image_path)
+register_image_field(ReviewImage, 'image')
 
 
 class Review(models.Model):
@@ -65,6 +51,16 @@ def handle_review_pre_save(sender, instance, *args, **kwargs):
         instance.name = instance.user.full_name
 
 
+@receiver([post_save, post_delete], sender=Review)
+def handle_review_cache_invalidation(sender, *args, **kwargs):
+    invalidate_cache_namespaces('product')
+
+
+@receiver([post_save, post_delete], sender=Review)
+def handle_review_product_card_change(sender, instance, *args, **kwargs):
+    refresh_product_cards([instance.product_id])
+
+
 class QA(models.Model):
     user = models.ForeignKey(UserBase, on_delete=models.SET_NULL, null=True)
     name = models.CharField(max_length=255, blank=True, null=True)
@@ -2,10 +2,11 @@ from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
 from ecommerce.api.site import (
-    CartAPI, ReviewAPI, WishListAPI, get_product_related_info)
+    CartAPI, ReviewAPI, ReviewImageAPI, WishListAPI, get_product_related_info)
 
 router = SimpleRouter()
 router.register('reviews', ReviewAPI)
+router.register('review-images', ReviewImageAPI)
 router.register('carts', CartAPI)
 router.register('wishlist', WishListAPI)
 
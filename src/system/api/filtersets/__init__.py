@@ -1,18 +1,40 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
 from django_filters import FilterSet, CharFilter
+from rest_framework.filters import SearchFilter
 from system.models import Product
 from system.models.product import (
-    Category, ProductVariation,
+    PRODUCT_SEARCH_CONFIG, Category, ProductVariation,
     VariationOption, VariationType
 )
 from rest_framework.exceptions import APIException
 
 
+class ProductSearchFilter(SearchFilter):
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, '').strip()
+        if not search:
+            return queryset
+        query = SearchQuery(search,
+                            search_type='websearch',
+                            config=PRODUCT_SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+        if request.query_params.get('ordering', None):
+            return queryset
+        return queryset.order_by('-search_rank', '-id')
+
+
 class ProductFilter(FilterSet):
     exclude = CharFilter(method='filter_exclude', label='Exclude Filter')
+    category_tree = CharFilter(method='filter_category_tree',
+                               label='Category Tree Filter')
 
     class Meta:
         model = Product
-        exclude = ('thumbnail_image',)
+        exclude = ('thumbnail_image', 'thumbnail_image_srcset',
+                   'search_vector')
 
     def filter_exclude(self, queryset, name, value):
         try:
@@ -21,6 +43,15 @@ class ProductFilter(FilterSet):
             raise APIException('Invalid values in ?exclude filter.')
         return queryset.exclude(id__in=exclude_ids)
 
+    def filter_category_tree(self, queryset, name, value):
+        path = Category.objects.filter(slug=value).values_list(
+            'path', flat=True).first()
+        if path is None:
+            return queryset.none()
+        product_ids = Product.categories.through.objects.filter(
+            category__path__startswith=path).values('product_id')
+        return queryset.filter(id__in=product_ids)
+
 
 class CategoryFilter(FilterSet):
     exclude = CharFilter(method='filter_exclude', label='Exclude Filter')
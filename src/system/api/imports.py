@@ -0,0 +1,22 @@
+from django.db import connection, transaction
+
+from core.permissions import IsAdmin
+from core.utils.viewsets import DefaultViewSet
+from system.models import CatalogImport
+from system.tasks import import_catalog_task
+
+from .serializers.imports import CatalogImportSerializer
+
+
+class CatalogImportAPI(DefaultViewSet):
+    serializer_class = CatalogImportSerializer
+    queryset = CatalogImport.objects.filter().order_by('-id')
+    permission_classes = [IsAdmin]
+    http_method_names = ['get', 'post', 'delete']
+    lookup_field = 'uuid'
+
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        schema_name = connection.schema_name
+        transaction.on_commit(
+            lambda: import_catalog_task.delay(schema_name, instance.id))
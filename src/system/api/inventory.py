@@ -0,0 +1,118 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils.timezone import now
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from core.permissions import IsAdmin
+from core.utils.caches import invalidate_cache_namespaces
+from system.models import ProductVariation
+from system.tasks import refresh_product_read_models_task
+
+BULK_UPDATE_KEYS = ['sku', 'slug']
+BULK_UPDATE_FIELDS = {
+    'stock': 'bigint',
+    'selling_price': 'numeric',
+    'crossed_price': 'numeric',
+    'cost_price': 'numeric',
+}
+BULK_UPDATE_BATCH_SIZE = 2000
+
+
+def parse_bulk_update_item(item, key_field):
+    key = str(item.get(key_field) or '').strip()
+    if not key:
+        raise ValueError(f'{key_field} is required.')
+    values = []
+    for field in BULK_UPDATE_FIELDS:
+        value = item.get(field, None)
+        if value is not None:
+            value = Decimal(str(value))
+            if field == 'stock':
+                if value != value.to_integral_value():
+                    raise ValueError('stock must be a whole number.')
+                value = int(value)
+            if value < 0:
+                raise ValueError(f'{field} cannot be negative.')
+        values.append(value)
+    if all(value is None for value in values):
+        raise ValueError('Nothing to update.')
+    return key, values
+
+
+def bulk_update_variations(key_field, rows):
+    table = ProductVariation._meta.db_table
+    columns = ', '.join(BULK_UPDATE_FIELDS)
+    assignments = ', '.join(f'{field} = COALESCE(v.{field}, pv.{field})'
+                            for field in BULK_UPDATE_FIELDS)
+    placeholder = '(%s::varchar, {})'.format(', '.join(
+        f'%s::{cast}' for cast in BULK_UPDATE_FIELDS.values()))
+    rows = list(rows.items())
+    matched = {}
+    product_ids = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BULK_UPDATE_BATCH_SIZE):
+            batch = rows[start:start + BULK_UPDATE_BATCH_SIZE]
+            params = [
+                value for key, values in batch for value in (key, *values)
+            ]
+            cursor.execute(
+                f"""
+                UPDATE {table} AS pv
+                SET {assignments}, updated_at = %s
+                FROM (VALUES {', '.join([placeholder] * len(batch))})
+                    AS v(key, {columns})
+                WHERE pv.{key_field} = v.key
+                RETURNING v.key, pv.product_id
+                """, [now(), *params])
+            for key, product_id in cursor.fetchall():
+                matched[key] = matched.get(key, 0) + 1
+                product_ids.add(product_id)
+    return matched, product_ids
+
+
+@api_view(['POST'])
+@permission_classes([IsAdmin])
+def variation_bulk_update(request):
+    '''
+    {
+        'key': 'sku' | 'slug',
+        'items': [{__key__, 'stock', 'selling_price', 'crossed_price',
+                   'cost_price'}]
+    }
+    '''
+    key_field = request.data.get('key', 'sku')
+    if key_field not in BULK_UPDATE_KEYS:
+        raise APIException(f'key must be one of {BULK_UPDATE_KEYS}.')
+    rows = {}
+    results = []
+    for index, item in enumerate(request.data.get('items', [])):
+        try:
+            key, values = parse_bulk_update_item(item, key_field)
+            rows[key] = values
+            results.append({'index': index, 'key': key})
+        except (AttributeError, ArithmeticError, TypeError,
+                ValueError) as exp:
+            results.append({
+                'index': index,
+                'key': item.get(key_field) if isinstance(item, dict) else None,
+                'status': 'invalid',
+                'error': f'{exp}'
+            })
+    with transaction.atomic():
+        matched, product_ids = bulk_update_variations(key_field, rows)
+        invalidate_cache_namespaces('product')
+        schema_name = connection.schema_name
+        transaction.on_commit(lambda: refresh_product_read_models_task.delay(
+            schema_name, list(product_ids)))
+    for result in results:
+        if 'status' not in result:
+            result['matched'] = matched.get(result['key'], 0)
+            result['status'] = 'updated' if result['matched'] else 'not_found'
+    return Response({
+        'status': True,
+        'updated': sum(matched.values()),
+        'results': results
+    })
@@ -1,51 +1,187 @@
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 
+from django.apps import apps
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 
+from core.middlewares import EstimatedCountPaginationMiddleware
 from core.permissions import IsStaffOrReadOnly
+from core.utils.caches import idempotent, invalidate_cache_namespaces
+from core.utils.functions import client_has_app
 from core.utils.permissions import IsOwnerOrAdmin
 from core.utils.viewsets import DefaultViewSet
-from system.api.serializers.order import (OrderItemSerializer,
-                                       OrderItemStatusSerializer,
+from system.api.serializers.order import (OrderItemStatusSerializer,
                                        OrderSerializer, OrderStatusSerializer)
 from system.api.serializers.payments import PaymentSerializer
 from system.models import Payment
-from system.models.order import Order, OrderItemStatus, OrderStatus
+from system.models.order import (Order, OrderItem, OrderItemStatus,
+                                 OrderStatus)
 from system.models.payment import FonePayPayment
+from system.models.product import ProductVariation, VariationOption
 from system.utils import generate_fonepay_qr, verify_qr
 
+TWO_PLACES = Decimal('0.01')
+
+
+def to_amount(value):
+    return value.quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def parse_order_items(items):
+    parsed = []
+    for item in items:
+        try:
+            variation_id = int(item['product'])
+            quantity = int(item.get('quantity', 1))
+        except (AttributeError, KeyError, TypeError, ValueError) as exp:
+            raise APIException(f'Invalid order item {item}: {exp}') from exp
+        if quantity < 1:
+            raise APIException(f'Invalid quantity for product {variation_id}.')
+        parsed.append((variation_id, quantity))
+    if not parsed:
+        raise APIException('Order must contain at least one item.')
+    return parsed
+
+
+def get_order_discount(discount_code):
+    if not discount_code:
+        return None
+    discount = None
+    if client_has_app('ecommerce'):
+        discount = apps.get_model('ecommerce', 'Discount').objects.filter(
+            discount_code=discount_code, is_active=True).first()
+    if discount is None:
+        raise APIException(f'Invalid discount code {discount_code}.')
+    return discount
+
+
+def price_order_item(variation, quantity, discount=None):
+    price_per_item = variation.selling_price
+    subtotal = price_per_item * quantity
+    discount_amount = Decimal(0)
+    if discount is not None and variation.is_eligible_for_discounts:
+        discount_amount = to_amount(subtotal * discount.discount_percent / 100)
+    taxable_amount = subtotal - discount_amount
+    tax_amount = Decimal(0)
+    if variation.tax_type == 'exclusive':
+        for tax in variation.taxes_applied.all():
+            if tax.rate_type == 'percent':
+                tax_amount += taxable_amount * tax.rate / 100
+            else:
+                tax_amount += tax.rate * quantity
+    return OrderItem(
+        product=variation,
+        product_name=variation.product.name,
+        variation=' '.join(
+            option.name
+            for option in variation.variation_option_combination.all()),
+        quantity=quantity,
+        price_per_item=price_per_item,
+        discount_amount=discount_amount,
+        discount_remarks=discount.name if discount_amount else '',
+        bill_amount=to_amount(taxable_amount + tax_amount))
+
+
+def build_order_items(items, discount=None):
+    '''
+    Prices every line from the stored variation, its taxes and the discount
+    so nothing the client sends about money is trusted.
+    '''
+    items = parse_order_items(items)
+    variations = ProductVariation.objects.filter(
+        is_active=True).select_related('product').prefetch_related(
+            'taxes_applied', 'variation_option_combination').in_bulk(
+                {variation_id for variation_id, _ in items})
+    if missing := {
+            variation_id
+            for variation_id, _ in items if variation_id not in variations
+    }:
+        raise APIException(f'Products {sorted(missing)} are not available.')
+    order_items = [
+        price_order_item(variations[variation_id], quantity, discount)
+        for variation_id, quantity in items
+    ]
+    total_price = sum(
+        (item.price_per_item * item.quantity for item in order_items),
+        Decimal(0))
+    return order_items, {
+        'total_price': to_amount(total_price),
+        'total_discount_amount': sum(
+            (item.discount_amount for item in order_items), Decimal(0)),
+        'total_bill_amount': sum(
+            (item.bill_amount for item in order_items), Decimal(0)),
+    }
+
 
 class OrderAPI(DefaultViewSet):
     serializer_class = OrderSerializer
     search_fields = ['user_name', 'user_contact']
     queryset = Order.objects.filter().order_by('-id')
     permission_classes = [IsOwnerOrAdmin]
+    pagination_class = EstimatedCountPaginationMiddleware
 
     def get_queryset(self):
         if self.request.user.is_staff:
             return self.queryset
         return self.queryset.filter(user=self.user)
 
+    @idempotent
     def create(self, request, *args, **kwargs):
+        '''
+        {
+            ...order fields,
+            'discount_code': __code__,
+            'order_items': [{'product': __variation_id__, 'quantity': 1}]
+        }
+        Prices and totals are computed on the server; only staff can give
+        an extra_discount.
+        '''
         with transaction.atomic():
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
-            order = serializer.save()
-            for order_items in request.data['order_items']:
-                order_items['order'] = order.id
-                serializer = OrderItemSerializer(data=order_items)
-                serializer.is_valid(raise_exception=True)
-                serializer.save()
-            order.save()
+            order_items, totals = build_order_items(
+                request.data.get('order_items', []),
+                get_order_discount(request.data.get('discount_code', None)))
+            extra_discount = (serializer.validated_data.get(
+                'extra_discount', Decimal(0))
+                              if request.user.is_staff else Decimal(0))
+            totals['total_discount_amount'] += extra_discount
+            totals['total_bill_amount'] = max(
+                totals['total_bill_amount'] - extra_discount, Decimal(0))
+            order = serializer.save(extra_discount=extra_discount,
+                                    total_amount_paid=Decimal(0),
+                                    **totals)
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+            invalidate_cache_namespaces('product')
+            order.sync_inventory()
 
-        headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED,
+        order = Order.objects.prefetch_related(
+            Prefetch('order_items',
+                     queryset=OrderItem.objects.select_related(
+                         'product').prefetch_related(
+                             'product__images', 'product__taxes_applied',
+                             Prefetch('product__variation_option_combination',
+                                      queryset=VariationOption.objects.
+                                      select_related('variation_type'))))
+        ).get(id=order.id)
+        data = self.get_serializer(order).data
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED,
                         headers=headers)
 
+    def perform_update(self, serializer):
+        # The post_save reservation runs in the same transaction as the
+        # status change, so a short variation rejects the update instead of
+        # leaving the order in a subtracting status with nothing reserved.
+        with transaction.atomic():
+            serializer.save()
+
     @action(methods=['POST'], detail=True,
             url_name='staff-approved-payment')
     def staff_approved_payment(self, request, *args, **kwargs):
@@ -66,6 +202,7 @@ class OrderAPI(DefaultViewSet):
 
     @action(methods=['post'], detail=True,
             url_name='initiate-fonepay')
+    @idempotent
     def initiate_fonepay(self, request, *args, **kwargs):
         obj = self.get_object()
         fonepay_obj = FonePayPayment.objects.create(
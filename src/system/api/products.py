@@ -1,11 +1,31 @@
-from django.db import transaction
+import hashlib
+import itertools
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.utils.functional import cached_property
+from django.utils.text import slugify
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
 
-from core.permissions import IsStaffOrReadOnly
+from core.permissions import IsAdmin, IsStaffOrReadOnly
+from core.utils.caches import (CachedResponseMixin, get_cache_stats,
+                               get_cache_versions)
+from core.utils.functions import (clean_data, client_has_app,
+                                  remove_spaces)
+from core.utils.media import get_media_queue_stats
 from core.utils.viewsets import DefaultViewSet
 from system.api.serializers.product import (AdminProductListSerializer,
                                          CategorySerializer,
+                                         ProductCardSerializer,
                                          ProductImageSerializer,
                                          ProductListSerializer,
                                          ProductSerializer,
@@ -13,30 +33,164 @@ from system.api.serializers.product import (AdminProductListSerializer,
                                          ProductVariationSerializer,
                                          VariationOptionSerializer,
                                          VariationTypeSerializer)
-from system.models.product import (Category, Product, ProductImage,
-                                ProductVariation, ProductVariationImage,
-                                VariationOption, VariationType)
+from system.models.product import (Category, Product, ProductCard,
+                                ProductImage, ProductVariation,
+                                ProductVariationImage, VariationOption,
+                                VariationType, get_availability_matrix,
+                                get_combination_key,
+                                refresh_product_read_models)
+
+from .filtersets import (CategoryFilter, ProductFilter, ProductSearchFilter,
+                         ProductVariationFilter, VariationOptionFilter,
+                         VariationTypeFilter)
+
 
-from .filtersets import (CategoryFilter, ProductFilter, ProductVariationFilter,
-                         VariationOptionFilter, VariationTypeFilter)
+def get_category_tree():
+    nodes = {}
+    tree = []
+    for category in Category.objects.order_by('depth', 'name').values(
+            'id', 'name', 'slug', 'parent_category_id'):
+        node = {
+            'id': category['id'],
+            'name': category['name'],
+            'slug': category['slug'],
+            'children': []
+        }
+        nodes[node['id']] = node
+        parent = nodes.get(category['parent_category_id'])
+        (parent['children'] if parent else tree).append(node)
+    return tree
 
 
-class CategoryAPI(DefaultViewSet):
+class CategoryAPI(CachedResponseMixin, DefaultViewSet):
     serializer_class = CategorySerializer
+    cache_namespaces = ['category']
     search_fields = ["name"]
     permission_classes = [IsStaffOrReadOnly]
     queryset = Category.objects.filter().order_by('-id')
     filterset_class = CategoryFilter
 
+    @action(methods=['GET'], detail=False)
+    def tree(self, request, *args, **kwargs):
+        key = f'category_tree_{get_cache_versions(self.cache_namespaces)}'
+        if (data := cache.get(key)) is None:
+            data = get_category_tree()
+            cache.set(key, data, settings.CATALOG_CACHE_SECONDS)
+        return Response({'status': True, 'data': data})
+
+
+def get_autocomplete_suggestions(term, size):
+    products = Product.objects.filter(
+        is_active=True, name__trigram_word_similar=term).annotate(
+            similarity=TrigramWordSimilarity(term, 'name')).order_by(
+                '-similarity').values('id', 'name', 'slug')[:size]
+    categories = Category.objects.filter(
+        name__trigram_word_similar=term).annotate(
+            similarity=TrigramWordSimilarity(term, 'name')).order_by(
+                '-similarity').values('id', 'name', 'slug')[:size]
+    variations = ProductVariation.objects.filter(
+        is_active=True, sku__trigram_word_similar=term).annotate(
+            similarity=TrigramWordSimilarity(term, 'sku')).order_by(
+                '-similarity').values('id', 'sku', 'slug',
+                                      'product__slug')[:size]
+    return {
+        'products': list(products),
+        'categories': list(categories),
+        'variations': list(variations)
+    }
 
-class ProductAPI(DefaultViewSet):
+
+def get_product_facets(queryset, price_buckets):
+    filtered_sql, params = queryset.order_by().values(
+        'id').query.sql_with_params()
+    product = Product._meta.db_table
+    category = Category._meta.db_table
+    product_categories = Product.categories.through._meta.db_table
+    variation = ProductVariation._meta.db_table
+    variation_options = (
+        ProductVariation.variation_option_combination.through._meta.db_table)
+    option = VariationOption._meta.db_table
+    variation_type = VariationType._meta.db_table
+    sql = f"""
+        WITH filtered AS ({filtered_sql})
+        SELECT 'categories', c.id, c.name, NULL,
+               COUNT(DISTINCT pc.product_id)
+        FROM {product_categories} pc
+        INNER JOIN filtered f ON f.id = pc.product_id
+        INNER JOIN {category} c ON c.id = pc.category_id
+        GROUP BY c.id, c.name
+        UNION ALL
+        SELECT 'options', o.id, o.name, t.name, COUNT(DISTINCT v.product_id)
+        FROM {variation} v
+        INNER JOIN filtered f ON f.id = v.product_id
+        INNER JOIN {variation_options} vo ON vo.productvariation_id = v.id
+        INNER JOIN {option} o ON o.id = vo.variationoption_id
+        INNER JOIN {variation_type} t ON t.id = o.variation_type_id
+        WHERE v.is_active
+        GROUP BY o.id, o.name, t.name
+        UNION ALL
+        SELECT 'prices',
+               WIDTH_BUCKET(dv.selling_price, %s::numeric[]), NULL, NULL,
+               COUNT(p.id)
+        FROM {product} p
+        INNER JOIN filtered f ON f.id = p.id
+        INNER JOIN {variation} dv ON dv.id = p.default_variant_id
+        GROUP BY 2
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*params, price_buckets))
+        rows = cursor.fetchall()
+    facets = {'categories': [], 'options': [], 'prices': []}
+    for facet, key, name, group, count in rows:
+        if facet == 'categories':
+            facets[facet].append({'id': key, 'name': name, 'count': count})
+        elif facet == 'options':
+            facets[facet].append({
+                'id': key,
+                'name': name,
+                'variation_type': group,
+                'count': count
+            })
+        elif key > 0:
+            facets[facet].append({
+                'from': price_buckets[key - 1],
+                'upto': (price_buckets[key]
+                         if key < len(price_buckets) else None),
+                'count': count
+            })
+    facets['prices'].sort(key=lambda bucket: bucket['from'])
+    return facets
+
+
+class ProductAPI(CachedResponseMixin, DefaultViewSet):
     serializer_class = ProductSerializer
+    cache_namespaces = ['product', 'category', 'variation_type']
+    filter_backends = [
+        DjangoFilterBackend, OrderingFilter, ProductSearchFilter
+    ]
     search_fields = ["name"]
     lookup_field = 'slug'
     permission_classes = [IsStaffOrReadOnly]
     queryset = Product.objects.filter().order_by('-id')
     filterset_class = ProductFilter
 
+    @cached_property
+    def has_reviews(self):
+        return client_has_app('ecommerce')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            return self.get_serializer_class().setup_eager_loading(
+                queryset, has_reviews=self.has_reviews)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['has_reviews'] = self.has_reviews
+        return context
+
     def get_serializer_class(self):
         if self.action == 'list':
             if self.request.user.is_staff:
@@ -49,7 +203,10 @@ class ProductAPI(DefaultViewSet):
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             obj = serializer.save()
-            data = request.data.copy()
+            # Uploaded files cannot be deep copied and were already
+            # consumed by the product, so only form fields are passed on.
+            data = (request.POST.copy()
+                    if request.FILES else request.data.copy())
             data['product'] = obj.id
             empty_variation_serializer = ProductVariationSerializer(
                 instance=obj, data=data)
@@ -58,6 +215,61 @@ class ProductAPI(DefaultViewSet):
         return Response(self.get_serializer(instance=obj).data,
                         status=status.HTTP_201_CREATED)
 
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request, *args, **kwargs):
+        term = remove_spaces(request.GET.get('q', '')).strip().lower()
+        if len(term) < settings.AUTOCOMPLETE_MIN_LENGTH:
+            return Response({
+                'status': True,
+                'products': [],
+                'categories': [],
+                'variations': []
+            })
+        try:
+            size = max(min(int(request.GET.get('size', 5)),
+                           settings.AUTOCOMPLETE_MAX_SIZE), 1)
+        except ValueError as exp:
+            raise APIException('Invalid value in ?size.') from exp
+        versions = get_cache_versions(['product', 'category'])
+        term_hash = hashlib.md5(term.encode()).hexdigest()
+        key = f'product_autocomplete_{versions}_{size}_{term_hash}'
+        if (data := cache.get(key)) is None:
+            data = get_autocomplete_suggestions(term, size)
+            cache.set(key, data, settings.AUTOCOMPLETE_CACHE_SECONDS)
+        return Response({'status': True, **data})
+
+    @action(methods=['GET'], detail=True)
+    def availability(self, request, *args, **kwargs):
+        # Checked before the matrix is built so unknown slugs are not cached.
+        if not self.get_queryset().filter(slug=kwargs['slug']).exists():
+            return Response({'status': False, 'error': 'Product not found.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(get_availability_matrix(kwargs['slug']))
+
+    @action(methods=['GET'], detail=False)
+    def facets(self, request, *args, **kwargs):
+        try:
+            price_buckets = sorted({
+                int(bucket) for bucket in request.GET.get(
+                    'price_buckets', settings.PRODUCT_FACET_PRICE_BUCKETS
+                ).split(',')
+            })
+        except ValueError as exp:
+            raise APIException('Invalid values in ?price_buckets.') from exp
+        signature = '&'.join(
+            f'{key}={value}'
+            for key, value in sorted(request.GET.lists())
+            if key not in ['page', 'size', 'ordering'])
+        versions = get_cache_versions(
+            ['product', 'category', 'variation_type'])
+        signature_hash = hashlib.md5(signature.encode()).hexdigest()
+        key = f'product_facets_{versions}_{signature_hash}'
+        if (data := cache.get(key)) is None:
+            data = get_product_facets(
+                self.filter_queryset(self.get_queryset()), price_buckets)
+            cache.set(key, data, settings.CATALOG_CACHE_SECONDS)
+        return Response({'status': True, **data})
+
 
 class ProductImageAPI(DefaultViewSet):
     serializer_class = ProductImageSerializer
@@ -78,8 +290,9 @@ class VariationOptionAPI(DefaultViewSet):
         return self.queryset.filter(variation_type__id=id)
 
 
-class VariationTypeAPI(DefaultViewSet):
+class VariationTypeAPI(CachedResponseMixin, DefaultViewSet):
     serializer_class = VariationTypeSerializer
+    cache_namespaces = ['variation_type']
     search_fields = ["name"]
     permission_classes = [IsStaffOrReadOnly]
     queryset = VariationType.objects.filter().order_by('-id')
@@ -100,6 +313,78 @@ class ProductVariationAPI(DefaultViewSet):
             return self.queryset.none()
         return self.queryset.filter(product__slug=slug)
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    @action(methods=['GET'], detail=False)
+    def resolve(self, request, *args, **kwargs):
+        try:
+            key = get_combination_key(request.GET['options'].split(','))
+        except (KeyError, ValueError) as exp:
+            raise APIException('Invalid values in ?options filter.') from exp
+        variation = self.get_queryset().filter(combination_key=key).first()
+        if variation is None:
+            raise NotFound('No variation matches the selected options.')
+        return Response(self.get_serializer(variation).data)
+
+    @action(methods=['POST'], detail=False)
+    def generate(self, request, *args, **kwargs):
+        product = Product.objects.prefetch_related(
+            Prefetch('enabled_variation_types__options',
+                     queryset=VariationOption.objects.order_by('id'))).get(
+                         slug=kwargs['product_slug'])
+        option_groups = [
+            list(variation_type.options.all())
+            for variation_type in product.enabled_variation_types.all()
+        ]
+        if not option_groups or not all(option_groups):
+            raise APIException(
+                'Product needs enabled variation types with options.')
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        defaults = clean_data([
+            'product', 'slug', 'variation_option_combination',
+            'taxes_applied', 'thumbnail_image', 'digital_file'
+        ], dict(serializer.validated_data))
+        existing_keys = set(
+            product.variations.exclude(combination_key=None).values_list(
+                'combination_key', flat=True))
+        variations = []
+        combinations = []
+        for combination in itertools.product(*option_groups):
+            key = get_combination_key(option.id for option in combination)
+            if key in existing_keys:
+                continue
+            names = ' '.join(option.name for option in combination)
+            variations.append(
+                ProductVariation(product=product,
+                                 slug=slugify(f"{product}-{names}"),
+                                 combination_key=key,
+                                 **defaults))
+            combinations.append(combination)
+        through = ProductVariation.variation_option_combination.through
+        with transaction.atomic():
+            ProductVariation.objects.bulk_create(variations)
+            through.objects.bulk_create([
+                through(productvariation_id=variation.id,
+                        variationoption_id=option.id)
+                for variation, combination in zip(variations, combinations)
+                for option in combination
+            ])
+            refresh_product_read_models([product.id])
+        return Response(
+            {
+                'status': True,
+                'created': len(variations),
+                'slugs': [variation.slug for variation in variations]
+            },
+            status=status.HTTP_201_CREATED)
+
 
 class ProductVariationImageAPI(DefaultViewSet):
     serializer_class = ProductVariationImageSerializer
@@ -111,3 +396,37 @@ class ProductVariationImageAPI(DefaultViewSet):
         if slug is None:
             return self.queryset.none()
         return self.queryset.filter(product_variation__slug=slug)
+
+
+class ProductCardAPI(GenericViewSet):
+    serializer_class = ProductCardSerializer
+    search_fields = ['name']
+    ordering_fields = ['product', 'name', 'selling_price', 'average_rating']
+    filterset_fields = ['in_stock']
+    queryset = ProductCard.objects.filter(
+        is_active=True).order_by('-product_id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if category := self.request.GET.get('category', None):
+            queryset = queryset.filter(category_names__contains=[category])
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(queryset))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def catalog_cache_stats(request):
+    return Response(get_cache_stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def media_queue_stats(request):
+    return Response(get_media_queue_stats(connection.schema_name))
@@ -0,0 +1,18 @@
+from rest_framework import serializers
+
+from system.models import CatalogImport
+
+
+class CatalogImportSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = CatalogImport
+        fields = '__all__'
+        read_only_fields = ('uuid', 'status', 'processed_rows',
+                            'imported_rows', 'errors')
+
+    def validate_document(self, value):
+        if not value.name.lower().endswith(('.csv', '.xlsx')):
+            raise serializers.ValidationError(
+                'Only .csv and .xlsx files can be imported.')
+        return value
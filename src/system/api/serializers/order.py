@@ -2,7 +2,7 @@ from rest_framework import serializers
 
 from system.models.order import (
     Order, OrderItem, OrderItemStatus, OrderStatus)
-from .product import ProductVariationSerializer, ProductSerializer
+from .product import ProductVariationSerializer
 
 
 class OrderStatusSerializer(serializers.ModelSerializer):
@@ -20,11 +20,8 @@ class OrderItemStatusSerializer(serializers.ModelSerializer):
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_detail = ProductSerializer(source='product', read_only=True)
-    variation_detail = ProductVariationSerializer(
-        source='variation', read_only=True)
-    status_detail = OrderItemStatusSerializer(
-        source='status', read_only=True)
+    product_detail = ProductVariationSerializer(source='product',
+                                                read_only=True)
 
     class Meta:
         model = OrderItem
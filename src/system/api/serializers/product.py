@@ -1,11 +1,24 @@
-from django.db.models import Avg, Sum
+from django.db.models import (Avg, Count, DecimalField, IntegerField, Max,
+                              OuterRef, Prefetch, Subquery, Sum, Value)
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 
 from core.utils.functions import client_has_app
-from core.utils.serializers import Base64ImageField
-from system.models.product import (Category, Product, ProductImage,
-                                ProductVariation, ProductVariationImage,
-                                VariationOption, VariationType)
+from core.utils.serializers import Base64ImageField, ImageSrcsetField
+from system.models.order import OrderItem
+from system.models.product import (Category, Product, ProductCard,
+                                ProductImage, ProductVariation,
+                                ProductVariationImage, VariationOption,
+                                VariationType)
+
+
+def product_subquery_aggregate(queryset, product_lookup, aggregate,
+                               output_field):
+    subquery = queryset.filter(**{product_lookup: OuterRef('pk')}).order_by(
+    ).values(product_lookup).annotate(value=aggregate).values('value')
+    return Coalesce(Subquery(subquery, output_field=output_field),
+                    Value(0),
+                    output_field=output_field)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -16,6 +29,7 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ProductImageSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=False, allow_null=True)
+    image_srcset = ImageSrcsetField('image')
 
     class Meta:
         model = ProductImage
@@ -46,6 +60,7 @@ class VariationTypeSerializer(serializers.ModelSerializer):
 
 class ProductVariationImageSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=False, allow_null=True)
+    image_srcset = ImageSrcsetField('image')
 
     class Meta:
         model = ProductVariationImage
@@ -68,7 +83,7 @@ class ProductVariationSerializer(serializers.ModelSerializer):
 
     def get_variation_option_combination_detail(self, instance):
         return VariationOptionSerializer(
-            instance.variation_option_combination.filter(), many=True).data
+            instance.variation_option_combination.all(), many=True).data
 
     def to_representation(self, instance):
         remove_conf = True
@@ -86,12 +101,13 @@ class ProductVariationSerializer(serializers.ModelSerializer):
 
 class ProductMiniSerializer(serializers.ModelSerializer):
     category_details = serializers.SerializerMethodField(read_only=True)
+    thumbnail_image_srcset = ImageSrcsetField('thumbnail_image')
     enabled_variation_types_details = serializers.SerializerMethodField(
         read_only=True)
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ('search_vector',)
 
     def get_category_details(self, instance):
         data = []
@@ -119,17 +135,41 @@ class ProductListSerializer(serializers.ModelSerializer):
     category_details = serializers.SerializerMethodField(read_only=True)
     default_variation = serializers.SerializerMethodField(read_only=True)
     test_thumbnail_image = serializers.SerializerMethodField(read_only=True)
+    thumbnail_image_srcset = ImageSrcsetField('thumbnail_image')
     review_summary = serializers.SerializerMethodField(read_only=True)
     enabled_variation_types_details = serializers.SerializerMethodField(
         read_only=True)
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ('search_vector',)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, has_reviews=False):
+        queryset = queryset.defer('search_vector').select_related(
+            'default_variant').prefetch_related(
+            'categories',
+            'enabled_variation_types',
+            'default_variant__images',
+            'default_variant__taxes_applied',
+            Prefetch('default_variant__variation_option_combination',
+                     queryset=VariationOption.objects.select_related(
+                         'variation_type')),
+        )
+        if has_reviews:
+            queryset = queryset.annotate(
+                total_reviews=Count('reviews', distinct=True),
+                average_rating=Avg('reviews__rating'))
+        return queryset
+
+    def has_reviews(self):
+        if 'has_reviews' not in self.context:
+            self.context['has_reviews'] = client_has_app('ecommerce')
+        return self.context['has_reviews']
 
     def get_enabled_variation_types_details(self, instance):
         data = []
-        for variation_type in instance.enabled_variation_types.filter():
+        for variation_type in instance.enabled_variation_types.all():
             data.append(
                 {
                     'id': variation_type.id,
@@ -141,7 +181,7 @@ class ProductListSerializer(serializers.ModelSerializer):
         return 'https://picsum.photos/500'
 
     def get_category_details(self, instance):
-        return CategorySerializer(instance.categories, many=True).data
+        return CategorySerializer(instance.categories.all(), many=True).data
 
     def get_default_variation(self, instance):
         if instance.default_variant:
@@ -149,12 +189,18 @@ class ProductListSerializer(serializers.ModelSerializer):
         return {}
 
     def get_review_summary(self, obj):
-        if not client_has_app('ecommerce'):
+        if not self.has_reviews():
             return {}
-        average_rating = obj.reviews.aggregate(
-            average_rating=Avg('rating'))['average_rating']
+        if hasattr(obj, 'total_reviews'):
+            total_reviews = obj.total_reviews
+            average_rating = obj.average_rating
+        else:
+            summary = obj.reviews.aggregate(
+                total_reviews=Count('id'), average_rating=Avg('rating'))
+            total_reviews = summary['total_reviews']
+            average_rating = summary['average_rating']
         return {
-            'total_reviews': obj.reviews.count(),
+            'total_reviews': total_reviews,
             'average_rating': (
                 average_rating if average_rating is not None else 0)
         }
@@ -168,14 +214,20 @@ class ProductSerializer(ProductListSerializer):
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ('search_vector',)
 
     def get_images(self, instance):
         return ProductImageSerializer(instance.images.filter(), many=True).data
 
     def get_variations(self, instance):
+        variations = instance.variations.filter(
+            is_active=True).prefetch_related(
+                'images', 'taxes_applied',
+                Prefetch('variation_option_combination',
+                         queryset=VariationOption.objects.select_related(
+                             'variation_type')))
         return ProductVariationSerializer(
-            instance.variations.filter(is_active=True),
+            variations,
             many=True, context={'request': self.context.get('request')}).data
 
 
@@ -190,41 +242,57 @@ class AdminProductListSerializer(ProductListSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ('search_vector',)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, has_reviews=False):
+        queryset = super().setup_eager_loading(queryset, has_reviews)
+        price_field = DecimalField(max_digits=60, decimal_places=2)
+        return queryset.annotate(
+            total_stock=product_subquery_aggregate(
+                ProductVariation.objects.all(), 'product', Sum('stock'),
+                IntegerField()),
+            total_sold=product_subquery_aggregate(
+                OrderItem.objects.filter(is_cancelled=False),
+                'product__product', Sum('quantity'), IntegerField()),
+            highest_cost_price=product_subquery_aggregate(
+                ProductVariation.objects.all(), 'product', Max('cost_price'),
+                price_field),
+            highest_selling_price=product_subquery_aggregate(
+                ProductVariation.objects.all(), 'product',
+                Max('selling_price'), price_field),
+            variants_count=product_subquery_aggregate(
+                ProductVariation.objects.all(), 'product', Count('id'),
+                IntegerField()),
+        )
 
     def get_test_thumbnail_image(self, instance):
         return 'https://picsum.photos/500'
 
     def get_total_sold(self, instance):
-        total_sold = 0
-        for variation in instance.variations.all():
-            sold = variation.order_items.filter(
-                is_cancelled=False).aggregate(
-                    total_sold=Sum('quantity'))['total_sold']
-            total_sold += sold if sold is not None else 0
-        return total_sold
+        return instance.total_sold
 
     def get_highest_cost_price(self, instance):
-        price = instance.variations.order_by('-cost_price').first().cost_price
-        return f"Rs. {price}/-"
+        return f"Rs. {instance.highest_cost_price}/-"
 
     def get_highest_selling_price(self, instance):
-        price = instance.variations.order_by(
-            '-selling_price').first().selling_price
-        return f"Rs. {price}/-"
+        return f"Rs. {instance.highest_selling_price}/-"
 
     def get_total_stock(self, instance):
-        total_stock = instance.variations.filter(
-        ).aggregate(
-            total_stock=Sum('stock'))['total_stock']
-        return total_stock if total_stock is not None else 0
+        return instance.total_stock
 
     def get_enabled_variations(self, instance):
         return ", ".join([
-            variation.name for variation in
-            instance.enabled_variation_types.filter(
-            )
+            variation.name
+            for variation in instance.enabled_variation_types.all()
         ])
 
     def get_variants(self, instance):
-        return instance.variations.count()
+        return instance.variants_count
+
+
+class ProductCardSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ProductCard
+        fields = '__all__'
@@ -0,0 +1,75 @@
+import time
+from io import BytesIO
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from core.utils.functions import encode_webp, optimize_image
+
+IMAGE_SUFFIXES = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff']
+
+
+def optimize_image_stepped(image, max_size_kb=120, max_width=600):
+    # The previous strategy: step the quality down by 5 until the encoding
+    # fits the budget, kept here as the benchmark baseline.
+    if max(image.size) > max_width:
+        ratio = max_width / max(image.size)
+        new_size = tuple(int(x * ratio) for x in image.size)
+        image = image.resize(new_size, Image.Resampling.LANCZOS)
+    quality = 100
+    buffer = encode_webp(image, quality)
+    while buffer.tell() > max_size_kb * 1024 and quality > 60:
+        quality -= 5
+        buffer = encode_webp(image, quality)
+    return buffer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark WebP encoding of optimize_image over sample images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths',
+                            nargs='+',
+                            help='Image files or directories of images')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def get_images(self, paths):
+        for path in map(Path, paths):
+            files = sorted(path.rglob('*')) if path.is_dir() else [path]
+            for file in files:
+                if file.suffix.lower() in IMAGE_SUFFIXES:
+                    yield file
+
+    def time_encoder(self, encoder, data, repeat):
+        timings = []
+        for _ in range(repeat):
+            image = Image.open(BytesIO(data))
+            image.load()
+            start = time.perf_counter()
+            buffer = encoder(image)
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000, len(buffer.getvalue())
+
+    def handle(self, *args, **kwargs):
+        if not (images := list(self.get_images(kwargs['paths']))):
+            raise CommandError('No sample images found.')
+        repeat = max(kwargs['repeat'], 1)
+        totals = [0, 0]
+        self.stdout.write(f"{'image':40} {'stepped ms':>11} {'search ms':>10}"
+                          f" {'stepped kb':>11} {'search kb':>10}")
+        for file in images:
+            data = file.read_bytes()
+            stepped_ms, stepped_size = self.time_encoder(
+                optimize_image_stepped, data, repeat)
+            search_ms, search_size = self.time_encoder(
+                optimize_image, data, repeat)
+            totals[0] += stepped_ms
+            totals[1] += search_ms
+            self.stdout.write(f'{file.name[:40]:40} {stepped_ms:11.1f}'
+                              f' {search_ms:10.1f} {stepped_size / 1024:11.1f}'
+                              f' {search_size / 1024:10.1f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(images)} images, mean encode time per image: stepped '
+            f'{totals[0] / len(images):.1f} ms, search '
+            f'{totals[1] / len(images):.1f} ms'))
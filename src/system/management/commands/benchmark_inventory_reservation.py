@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.forms import ValidationError
+from django_tenants.utils import schema_context
+
+from system.models import Product, ProductVariation
+from system.models.order import reserve_stock
+
+
+class Command(BaseCommand):
+    help = ('Fire parallel checkouts at a single variation and check that '
+            'reserve_stock never oversells it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name')
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--checkouts', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=50)
+        parser.add_argument('--quantity', type=int, default=1)
+
+    def checkout(self, schema_name, variation_id, quantity):
+        start = time.perf_counter()
+        try:
+            with schema_context(schema_name):
+                with transaction.atomic():
+                    reserve_stock({variation_id: quantity})
+            reserved = True
+        except ValidationError:
+            reserved = False
+        finally:
+            connection.close()
+        return reserved, time.perf_counter() - start
+
+    def handle(self, *args, **kwargs):
+        schema_name = kwargs['schema_name']
+        quantity = kwargs['quantity']
+        with schema_context(schema_name):
+            product = Product.objects.create(
+                name=f'Inventory Benchmark {time.time_ns()}',
+                continue_selling_after_out_of_stock=False)
+            variation = ProductVariation.objects.create(
+                product=product, stock=kwargs['stock'])
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=kwargs['workers']) as pool:
+                results = list(
+                    pool.map(
+                        lambda _: self.checkout(schema_name, variation.id,
+                                                quantity),
+                        range(kwargs['checkouts'])))
+            elapsed = time.perf_counter() - start
+            with schema_context(schema_name):
+                variation.refresh_from_db()
+        finally:
+            with schema_context(schema_name):
+                product.delete()
+
+        reserved = sum(1 for ok, _ in results if ok)
+        latencies = sorted(latency for _, latency in results)
+        expected = min(kwargs['stock'] // quantity, kwargs['checkouts'])
+        self.stdout.write(
+            f'checkouts: {len(results)}, reserved: {reserved}, rejected: '
+            f'{len(results) - reserved}, final stock: {variation.stock}')
+        self.stdout.write(
+            f'{len(results) / elapsed:.1f} checkouts/s, p50 '
+            f'{latencies[len(latencies) // 2] * 1000:.1f} ms, p99 '
+            f'{latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms')
+        if (reserved == expected and variation.stock
+                == kwargs['stock'] - reserved * quantity):
+            self.stdout.write(self.style.SUCCESS('No overselling.'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'Expected {expected} reservations, stock is inconsistent.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django_tenants.utils import tenant_context
+
+from core.utils.functions import client_has_app
+from system.models import Product, ProductCard
+from tenants.models import Client
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product card read model for every tenant'
+
+    def handle(self, *args, **kwargs):
+        for client in Client.objects.exclude(schema_name='public'):
+            with tenant_context(client):
+                if client_has_app('system'):
+                    for product_id in Product.objects.values_list(
+                            'id', flat=True):
+                        ProductCard.refresh(product_id)
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Refreshed product cards for: {client}'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:15
+
+import core.utils.functions
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='system.product')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.CharField(blank=True, max_length=255, null=True)),
+                ('thumbnail_image', models.CharField(blank=True, default='', max_length=500)),
+                ('default_variant_slug', models.CharField(blank=True, max_length=255, null=True)),
+                ('selling_price', models.DecimalField(decimal_places=2, default=0.0, max_digits=60)),
+                ('crossed_price', models.DecimalField(decimal_places=2, default=0.0, max_digits=60)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('category_names', models.JSONField(blank=True, default=core.utils.functions.default_array)),
+                ('total_reviews', models.PositiveIntegerField(default=0)),
+                ('average_rating', models.DecimalField(decimal_places=2, default=0.0, max_digits=4)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-product_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField
+
+
+def populate_search_vector(apps, schema_editor):
+    # Mirrors get_product_search_vector as of this migration, built on the
+    # historical models so later model changes cannot break it.
+    Category = apps.get_model('system', 'Category')
+    Product = apps.get_model('system', 'Product')
+    VariationOption = apps.get_model('system', 'VariationOption')
+    category_names = Category.objects.filter(
+        product=OuterRef('pk')).order_by().values('product').annotate(
+            names=StringAgg('name', ' ')).values('names')
+    option_names = VariationOption.objects.filter(
+        variations__product=OuterRef('pk')).order_by().values(
+            'variations__product').annotate(names=StringAgg(
+                'name', ' ', distinct=True)).values('names')
+    Product.objects.update(search_vector=(
+        SearchVector('name', weight='A', config='simple')
+        + SearchVector(Subquery(category_names, output_field=TextField()),
+                       weight='B',
+                       config='simple')
+        + SearchVector(Subquery(option_names, output_field=TextField()),
+                       weight='C',
+                       config='simple')
+        + SearchVector('description', weight='D', config='simple')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0003_productcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.RunPython(populate_search_vector,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:17
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0004_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public;',
+            migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='category_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='productvariation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['sku'], name='variation_sku_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model('system', 'Category')
+    categories = {
+        category.id: category
+        for category in Category.objects.all()
+    }
+
+    def get_path(category):
+        if not category.path:
+            parent = categories.get(category.parent_category_id)
+            parent_path = get_path(parent) if parent else ''
+            category.path = f'{parent_path}{category.id}/'
+            category.depth = category.path.count('/') - 1
+        return category.path
+
+    for category in categories.values():
+        get_path(category)
+    Category.objects.bulk_update(categories.values(), ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0005_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(populate_category_paths,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+def populate_combination_keys(apps, schema_editor):
+    ProductVariation = apps.get_model('system', 'ProductVariation')
+    seen = set()
+    variations = []
+    for variation in ProductVariation.objects.prefetch_related(
+            'variation_option_combination').order_by('id'):
+        option_ids = sorted(
+            option.id
+            for option in variation.variation_option_combination.all())
+        key = '-'.join(str(option_id) for option_id in option_ids) or None
+        if key is None or (variation.product_id, key) in seen:
+            continue
+        seen.add((variation.product_id, key))
+        variation.combination_key = key
+        variations.append(variation)
+    ProductVariation.objects.bulk_update(variations, ['combination_key'],
+                                         batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0006_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariation',
+            name='combination_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(populate_combination_keys,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productvariation',
+            constraint=models.UniqueConstraint(fields=('product', 'combination_key'), name='unique_product_variation_combination'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:21
+
+import core.utils.functions
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0007_variation_combination_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, unique=True)),
+                ('document', models.FileField(upload_to='imports/')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('processing', 'processing'), ('done', 'done'), ('failed', 'failed')], default='queued', max_length=25)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('imported_rows', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=core.utils.functions.default_array)),
+            ],
+            options={
+                'ordering': ['-is_active', '-id'],
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0008_catalogimport'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productvariation',
+            index=models.Index(fields=['sku'], name='variation_sku_idx'),
+        ),
+    ]
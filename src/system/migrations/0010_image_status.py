@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0009_variation_sku_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail_image_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('done', 'done'), ('failed', 'failed')], default='done', editable=False, max_length=25),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('done', 'done'), ('failed', 'failed')], default='done', editable=False, max_length=25),
+        ),
+        migrations.AddField(
+            model_name='productvariationimage',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('done', 'done'), ('failed', 'failed')], default='done', editable=False, max_length=25),
+        ),
+    ]
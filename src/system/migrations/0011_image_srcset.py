@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:29
+
+import core.utils.functions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0010_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail_image_srcset',
+            field=models.JSONField(blank=True, default=core.utils.functions.default_json, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='thumbnail_image_srcset',
+            field=models.JSONField(blank=True, default=core.utils.functions.default_json),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_srcset',
+            field=models.JSONField(blank=True, default=core.utils.functions.default_json, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productvariationimage',
+            name='image_srcset',
+            field=models.JSONField(blank=True, default=core.utils.functions.default_json, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:30
+
+import core.utils.functions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0011_image_srcset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=500, unique=True)),
+                ('srcset', models.JSONField(blank=True, default=core.utils.functions.default_json)),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+def settle_existing_orders(apps, schema_editor):
+    # Stock of existing orders was handled before reservations were tracked.
+    # Count them as reserved with nothing taken, so saving them does not
+    # take their stock again and releasing them gives nothing back.
+    Order = apps.get_model('system', 'Order')
+    OrderItem = apps.get_model('system', 'OrderItem')
+    reserved = Order.objects.filter(status__subtract_from_inventory=True,
+                                    is_cancelled=False)
+    reserved.update(inventory_reserved=True)
+    OrderItem.objects.filter(order__in=reserved,
+                             is_cancelled=False).update(reserved_quantity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0012_mediaasset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='inventory_reserved',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='reserved_quantity',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(settle_existing_orders,
+                             migrations.RunPython.noop),
+    ]
@@ -2,3 +2,5 @@ from .product import *
 from .payment import *
 from .order import *
 from .misc import *
+from .imports import *
+from .media import *
@@ -0,0 +1,26 @@
+import uuid
+
+from django.db import models
+
+from core.utils.functions import default_array
+from core.utils.models import TimeStampedModel
+
+
+class CatalogImport(TimeStampedModel):
+    STATUS_CHOICES = (
+        ('queued', 'queued'),
+        ('processing', 'processing'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    )
+    uuid = models.UUIDField(unique=True, default=uuid.uuid4)
+    document = models.FileField(upload_to='imports/')
+    status = models.CharField(max_length=25,
+                              choices=STATUS_CHOICES,
+                              default='queued')
+    processed_rows = models.PositiveIntegerField(default=0)
+    imported_rows = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=default_array, blank=True)
+
+    def __str__(self):
+        return f'{self.document.name}: {self.status}'
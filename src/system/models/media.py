@@ -0,0 +1,36 @@
+from django.db import models, transaction
+
+from core.utils.functions import default_json
+
+
+class MediaAsset(models.Model):
+    content_hash = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=500, unique=True)
+    srcset = models.JSONField(default=default_json, blank=True)
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name}'
+
+    @classmethod
+    def acquire(cls, content_hash):
+        if cls.objects.filter(content_hash=content_hash).update(
+                references=models.F('references') + 1):
+            return cls.objects.get(content_hash=content_hash)
+        return None
+
+    @classmethod
+    def release(cls, name, storage):
+        with transaction.atomic():
+            asset = cls.objects.select_for_update().filter(name=name).first()
+            if asset is None:
+                return
+            if asset.references > 1:
+                asset.references -= 1
+                asset.save(update_fields=['references'])
+                return
+            names = {asset.name, *asset.srcset.values()}
+            asset.delete()
+            transaction.on_commit(
+                lambda: [storage.delete(stale_name) for stale_name in names])
@@ -1,8 +1,17 @@
-from django.db import models
+from collections import Counter
 
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.forms import ValidationError
+from django.utils.timezone import now
+
+from core.utils.caches import invalidate_cache_namespaces
 from core.utils.functions import default_json
 from core.utils.models import TimeStampedModel
-from system.models.product import ProductVariation
+from system.models.product import (ProductVariation,
+                                   queue_product_read_models_refresh)
 from users.models.users import UserBase
 
 
@@ -62,10 +71,51 @@ class Order(TimeStampedModel):
                                          default='',
                                          blank=True)
     geo_tag = models.JSONField(default=default_json, blank=True)
+    inventory_reserved = models.BooleanField(default=False, editable=False)
 
     def __str__(self, instance):
         return f'{instance.user}' if instance.user else instance.user_name
 
+    def sync_inventory(self):
+        '''
+        Reserves the stock of every live item while the order is in a status
+        that subtracts from inventory, and gives back what an item actually
+        took once the order leaves that status or the item is cancelled.
+        '''
+        with transaction.atomic():
+            order = Order.objects.select_for_update().select_related(
+                'status').get(id=self.id)
+            subtract = (order.status.subtract_from_inventory
+                        and not order.is_cancelled)
+            reserve, release = [], []
+            for item in order.order_items.all():
+                keep = subtract and not item.is_cancelled
+                if keep and item.reserved_quantity is None:
+                    reserve.append(item)
+                elif not keep and item.reserved_quantity is not None:
+                    release.append(item)
+            quantities = Counter()
+            for item in reserve:
+                quantities[item.product_id] += item.quantity
+            taken = reserve_stock(quantities)
+            for item in reserve:
+                item.reserved_quantity = min(item.quantity,
+                                             taken[item.product_id])
+                taken[item.product_id] -= item.reserved_quantity
+            released = Counter()
+            for item in release:
+                released[item.product_id] += item.reserved_quantity
+                item.reserved_quantity = None
+            release_stock(released)
+            OrderItem.objects.bulk_update(reserve + release,
+                                          ['reserved_quantity'])
+            if subtract != order.inventory_reserved:
+                Order.objects.filter(id=order.id).update(
+                    inventory_reserved=subtract)
+            self.inventory_reserved = subtract
+            if quantities or released:
+                refresh_stock_read_models(quantities + released)
+
 
 class OrderItemStatus(TimeStampedModel):
     name = models.CharField(max_length=255, unique=True)
@@ -102,3 +152,101 @@ class OrderItem(TimeStampedModel):
     cancelled_remarks = models.TextField(default='', blank=True)
     returned_remarks = models.TextField(default='', blank=True)
     refunded_remarks = models.TextField(default='', blank=True)
+    # Stock taken for this item, which can be less than quantity for
+    # products sold past zero. None while nothing is reserved.
+    reserved_quantity = models.PositiveBigIntegerField(null=True,
+                                                       blank=True,
+                                                       editable=False)
+
+
+def reserve_stock(quantities):
+    '''
+    Takes {variation_id: quantity} out of stock with one conditional UPDATE
+    per variation, in id order so concurrent checkouts lock rows in the same
+    order and cannot deadlock. Must run inside a transaction so a short
+    variation rolls back the ones already taken. Returns the quantity
+    actually taken per variation, since oversellable products stop at zero.
+    '''
+    oversellable = set(
+        ProductVariation.objects.filter(
+            id__in=quantities,
+            product__continue_selling_after_out_of_stock=True).values_list(
+                'id', flat=True))
+    taken = Counter()
+    for variation_id in sorted(quantities):
+        quantity = quantities[variation_id]
+        variations = ProductVariation.objects.filter(id=variation_id)
+        if variation_id in oversellable:
+            stock = variations.select_for_update().values_list(
+                'stock', flat=True).first() or 0
+            quantity = min(quantity, stock)
+            variations.update(stock=F('stock') - quantity, updated_at=now())
+        elif not variations.filter(stock__gte=quantity).update(
+                stock=F('stock') - quantity, updated_at=now()):
+            raise ValidationError(
+                f'Not enough stock for product {variation_id}.')
+        taken[variation_id] = quantity
+    return taken
+
+
+def release_stock(quantities):
+    for variation_id in sorted(quantities):
+        ProductVariation.objects.filter(id=variation_id).update(
+            stock=F('stock') + quantities[variation_id], updated_at=now())
+
+
+def release_order_items(items):
+    '''
+    Gives back the stock reserved by the items and clears their reservation,
+    so releasing the same items again gives nothing back.
+    '''
+    with transaction.atomic():
+        items = items.select_for_update().filter(reserved_quantity__gt=0)
+        quantities = Counter()
+        for variation_id, quantity in items.values_list(
+                'product', 'reserved_quantity'):
+            quantities[variation_id] += quantity
+        if not quantities:
+            return
+        items.update(reserved_quantity=None)
+        release_stock(quantities)
+        refresh_stock_read_models(quantities)
+
+
+def refresh_stock_read_models(quantities):
+    queue_product_read_models_refresh(
+        ProductVariation.objects.filter(id__in=quantities).values_list(
+            'product_id', flat=True))
+
+
+@receiver(post_save, sender=Order)
+def handle_order_inventory(sender, instance, created, *args, **kwargs):
+    # New orders are synced by the creator once their items exist. Callers
+    # save inside a transaction so a failed reservation rolls the change back.
+    if not created:
+        instance.sync_inventory()
+
+
+@receiver(post_save, sender=OrderItem)
+def handle_order_item_inventory(sender, instance, *args, **kwargs):
+    # Cancelling an item gives its stock back, adding one to a reserved
+    # order takes it. Items created in bulk are synced by their creator.
+    instance.order.sync_inventory()
+
+
+# Deleted orders and items would otherwise take their reserved stock with
+# them. Both run inside the delete's transaction.
+@receiver(pre_delete, sender=Order)
+def handle_order_delete_inventory(sender, instance, *args, **kwargs):
+    release_order_items(instance.order_items.all())
+
+
+@receiver(pre_delete, sender=OrderItem)
+def handle_order_item_delete_inventory(sender, instance, *args, **kwargs):
+    release_order_items(OrderItem.objects.filter(id=instance.id))
+
+
+# Staff product lists report sales totals summed from order items.
+@receiver([post_save, post_delete], sender=OrderItem)
+def handle_order_item_cache_invalidation(sender, *args, **kwargs):
+    invalidate_cache_namespaces('product')
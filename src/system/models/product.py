@@ -1,15 +1,25 @@
-import contextlib
-import os
 import random
 
-from django.db import models
-from django.db.models.signals import m2m_changed, pre_save
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models, transaction
+from django.db.models import (Avg, Count, F, Index, OuterRef, Subquery,
+                              TextField, Value)
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
 from django.dispatch import receiver
 from django.forms import ValidationError
 from django.utils.text import slugify
-from PIL import Image
 
-from core.utils.functions import optimize_image
+from core.utils.caches import get_cache_versions, invalidate_cache_namespaces
+from core.utils.functions import (IMAGE_STATUS_CHOICES, client_has_app,
+                                  default_array, default_json,
+                                  get_srcset_urls)
+from core.utils.media import register_image_field
 from core.utils.models import AbstractProductInfo
 
 
@@ -21,14 +31,53 @@ class Category(models.Model):
                                         on_delete=models.PROTECT,
                                         null=True,
                                         blank=True)
+    path = models.CharField(max_length=255,
+                            default='',
+                            blank=True,
+                            editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            GinIndex(fields=['name'],
+                     name='category_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+            Index(fields=['path'],
+                  name='category_path_idx',
+                  opclasses=['varchar_pattern_ops']),
+        ]
 
     def save(self, *args, **kwargs):
         if hasattr(self, 'name'):
             self.slug = slugify(self.name)
-        return super().save(*args, **kwargs)
+        with transaction.atomic():
+            result = super().save(*args, **kwargs)
+            self.update_path()
+        return result
+
+    def update_path(self):
+        parent_path = ''
+        if self.parent_category_id:
+            parent_path = Category.objects.filter(
+                id=self.parent_category_id).values_list('path',
+                                                        flat=True).first()
+            if self.path and parent_path.startswith(self.path):
+                raise ValidationError(
+                    'Category cannot be moved under its own subcategory.')
+        path = f'{parent_path}{self.id}/'
+        if path == self.path:
+            return
+        depth = path.count('/') - 1
+        old_path, old_depth = self.path, self.depth
+        Category.objects.filter(id=self.id).update(path=path, depth=depth)
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(
+                id=self.id).update(
+                    path=Concat(Value(path),
+                                Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + depth - old_depth)
+        self.path, self.depth = path, depth
 
     def __str__(self):
         if hasattr(self, 'name'):
@@ -71,6 +120,13 @@ class Product(models.Model):
     thumbnail_image = models.ImageField(upload_to=image_directory_path,
                                         blank=True,
                                         null=True)
+    thumbnail_image_status = models.CharField(max_length=25,
+                                              choices=IMAGE_STATUS_CHOICES,
+                                              default='done',
+                                              editable=False)
+    thumbnail_image_srcset = models.JSONField(default=default_json,
+                                              blank=True,
+                                              editable=False)
     enabled_variation_types = models.ManyToManyField(VariationType, blank=True)
     default_variant = models.ForeignKey('ProductVariation',
                                         on_delete=models.SET_NULL,
@@ -79,11 +135,21 @@ class Product(models.Model):
                                         default=None,
                                         related_name='default_product')
     continue_selling_after_out_of_stock = models.BooleanField(default=True)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
 
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'],
+                     name='product_search_vector_idx'),
+            GinIndex(fields=['name'],
+                     name='product_name_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+        ]
+
     def save(self, *args, **kwargs):
         self.name = self.name.title()
         return super().save(*args, **kwargs)
@@ -99,23 +165,9 @@ def handle_product_pre_save(sender, instance, *args, **kwargs):
         if instance.default_variant.product != instance:
             raise ValidationError(
                 "Default variant must be a variant of selected product.")
-    if instance.thumbnail_image:
-        with contextlib.suppress(Exception):
-            image_name = instance.thumbnail_image.name
-            if not image_name.endswith('.webp'):
-                if "/" in instance.thumbnail_image.name:
-                    image_name = instance.thumbnail_image.name.split('/')[-1]
-                temp_output_image_path = f"temp_{image_name}"
-                with instance.thumbnail_image.open("rb") as image_file:
-                    image = Image.open(image_file)
-                    optimized_image_path = optimize_image(
-                        image, temp_output_image_path)
-                with open(optimized_image_path, "rb") as optimized_image_file:
-                    instance.thumbnail_image.save(image_name.replace(
-                        image_name.split('.')[-1], 'webp'),
-                                                  optimized_image_file,
-                                                  save=False)
-                os.remove(optimized_image_path)
+
+
+register_image_field(Product, 'thumbnail_image')
 
 
 def file_directory_path(instance, filename):
@@ -143,8 +195,25 @@ class ProductVariation(AbstractProductInfo):
                                     blank=True,
                                     null=True)
     slug = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    combination_key = models.CharField(max_length=255,
+                                       blank=True,
+                                       null=True,
+                                       editable=False)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['sku'],
+                     name='variation_sku_trgm_idx',
+                     opclasses=['gin_trgm_ops']),
+            Index(fields=['sku'], name='variation_sku_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'combination_key'],
+                name='unique_product_variation_combination'),
+        ]
+
     def __str__(self):
         variation_combination = [
             str(option)
@@ -153,19 +222,24 @@ class ProductVariation(AbstractProductInfo):
         return f"{self.product} {' '.join(variation_combination)}"
 
 
+def get_combination_key(option_ids):
+    return '-'.join(str(option_id)
+                    for option_id in sorted(set(map(int, option_ids)))) or None
+
+
 @receiver(m2m_changed,
           sender=ProductVariation.variation_option_combination.through)
 def handle_variation_option_combination_change(sender, instance, action,
                                                **kwargs):
     if action in ['post_add', 'post_remove', 'post_clear']:
-        variation_combination = [
-            option.name
-            for option in (instance.variation_option_combination.all())
-        ]
+        options = list(instance.variation_option_combination.all())
+        variation_combination = [option.name for option in options]
         if not variation_combination:
             variation_combination = [str(random.randint(10000, 99999))]
         instance.slug = slugify(
             f"{instance.product}-{' '.join(variation_combination)}")
+        instance.combination_key = get_combination_key(
+            option.id for option in options)
         instance.save()
 
 
@@ -176,27 +250,16 @@ class ProductImage(models.Model):
     image = models.ImageField(upload_to=image_directory_path2,
                               null=True,
                               blank=True)
+    image_status = models.CharField(max_length=25,
+                                    choices=IMAGE_STATUS_CHOICES,
+                                    default='done',
+                                    editable=False)
+    image_srcset = models.JSONField(default=default_json,
+                                    blank=True,
+                                    editable=False)
 
 
-@receiver(pre_save, sender=ProductImage)
-def handle_product_image_pre_save(sender, instance, *args, **kwargs):
-    if instance.image:
-        with contextlib.suppress(Exception):
-            image_name = instance.image.name
-            if not image_name.endswith('.webp'):
-                if "/" in instance.image.name:
-                    image_name = instance.image.name.split('/')[-1]
-                temp_output_image_path = f"temp_{image_name}"
-                with instance.image.open("rb") as image_file:
-                    image = Image.open(image_file)
-                    optimized_image_path = optimize_image(
-                        image, temp_output_image_path)
-                with open(optimized_image_path, "rb") as optimized_image_file:
-                    instance.image.save(image_name.replace(
-                        image_name.split('.')[-1], 'webp'),
-                                        optimized_image_file,
-                                        save=False)
-                os.remove(optimized_image_path)
+register_image_field(ProductImage, 'image')
 
 
 def image_directory_path3(instance, filename):
@@ -210,24 +273,312 @@ class ProductVariationImage(models.Model):
     image = models.ImageField(upload_to=image_directory_path3,
                               null=True,
                               blank=True)
+    image_status = models.CharField(max_length=25,
+                                    choices=IMAGE_STATUS_CHOICES,
+                                    default='done',
+                                    editable=False)
+    image_srcset = models.JSONField(default=default_json,
+                                    blank=True,
+                                    editable=False)
+
+
+register_image_field(ProductVariationImage, 'image')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def handle_category_cache_invalidation(sender, *args, **kwargs):
+    invalidate_cache_namespaces('category', 'product')
+
 
+@receiver([post_save, post_delete], sender=VariationType)
+@receiver([post_save, post_delete], sender=VariationOption)
+def handle_variation_type_cache_invalidation(sender, *args, **kwargs):
+    invalidate_cache_namespaces('variation_type', 'product')
 
-@receiver(pre_save, sender=ProductVariationImage)
-def handle_product_image_variation_pre_save(sender, instance, *args, **kwargs):
-    if instance.image:
-        with contextlib.suppress(Exception):
-            image_name = instance.image.name
-            if not image_name.endswith('.webp'):
-                if "/" in instance.image.name:
-                    image_name = instance.image.name.split('/')[-1]
-                temp_output_image_path = f"temp_{image_name}"
-                with instance.image.open("rb") as image_file:
-                    image = Image.open(image_file)
-                    optimized_image_path = optimize_image(
-                        image, temp_output_image_path)
-                with open(optimized_image_path, "rb") as optimized_image_file:
-                    instance.image.save(image_name.replace(
-                        image_name.split('.')[-1], 'webp'),
-                                        optimized_image_file,
-                                        save=False)
-                os.remove(optimized_image_path)
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductVariation)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductVariationImage)
+def handle_product_cache_invalidation(sender, *args, **kwargs):
+    invalidate_cache_namespaces('product')
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(m2m_changed, sender=Product.enabled_variation_types.through)
+@receiver(m2m_changed,
+          sender=ProductVariation.variation_option_combination.through)
+@receiver(m2m_changed, sender=ProductVariation.taxes_applied.through)
+def handle_product_m2m_cache_invalidation(sender, action, *args, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        invalidate_cache_namespaces('product')
+
+
+class ProductCard(models.Model):
+    product = models.OneToOneField(Product,
+                                   on_delete=models.CASCADE,
+                                   primary_key=True,
+                                   related_name='card')
+    name = models.CharField(max_length=255)
+    slug = models.CharField(max_length=255, blank=True, null=True)
+    thumbnail_image = models.CharField(max_length=500, default='', blank=True)
+    thumbnail_image_srcset = models.JSONField(default=default_json,
+                                              blank=True)
+    default_variant_slug = models.CharField(max_length=255,
+                                            blank=True,
+                                            null=True)
+    selling_price = models.DecimalField(default=0.00,
+                                        max_digits=60,
+                                        decimal_places=2)
+    crossed_price = models.DecimalField(default=0.00,
+                                        max_digits=60,
+                                        decimal_places=2)
+    in_stock = models.BooleanField(default=False)
+    category_names = models.JSONField(default=default_array, blank=True)
+    total_reviews = models.PositiveIntegerField(default=0)
+    average_rating = models.DecimalField(default=0.00,
+                                         max_digits=4,
+                                         decimal_places=2)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-product_id']
+
+    def __str__(self):
+        return f'{self.name}'
+
+    @classmethod
+    def refresh(cls, product_id):
+        product = Product.objects.select_related('default_variant').filter(
+            id=product_id).first()
+        if product is None:
+            cls.objects.filter(product_id=product_id).delete()
+            return None
+        variant = product.default_variant
+        card = {
+            'name': product.name,
+            'slug': product.slug,
+            'thumbnail_image': (product.thumbnail_image.url
+                                if product.thumbnail_image else ''),
+            'thumbnail_image_srcset': (
+                get_srcset_urls(product.thumbnail_image_srcset,
+                                product.thumbnail_image.storage)
+                if product.thumbnail_image else {}),
+            'default_variant_slug': variant.slug if variant else None,
+            'selling_price': variant.selling_price if variant else 0,
+            'crossed_price': variant.crossed_price if variant else 0,
+            'in_stock': (product.continue_selling_after_out_of_stock
+                         or product.variations.filter(
+                             is_active=True, stock__gt=0).exists()),
+            'category_names': list(
+                product.categories.values_list('name', flat=True)),
+            'is_active': product.is_active,
+        }
+        if client_has_app('ecommerce'):
+            summary = product.reviews.aggregate(
+                total_reviews=Count('id'), average_rating=Avg('rating'))
+            card['total_reviews'] = summary['total_reviews']
+            card['average_rating'] = summary['average_rating'] or 0
+        return cls.objects.update_or_create(product=product,
+                                            defaults=card)[0]
+
+
+def refresh_product_cards(product_ids):
+    product_ids = set(product_ids)
+
+    def refresh():
+        for product_id in product_ids:
+            ProductCard.refresh(product_id)
+
+    if product_ids:
+        transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Product)
+def handle_product_card_product_change(sender, instance, *args, **kwargs):
+    refresh_product_cards([instance.id])
+
+
+@receiver([post_save, post_delete], sender=ProductVariation)
+def handle_product_card_variation_change(sender, instance, *args, **kwargs):
+    refresh_product_cards([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def handle_product_card_categories_change(sender, instance, action, reverse,
+                                          pk_set, *args, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        refresh_product_cards([instance.id])
+    elif pk_set:
+        refresh_product_cards(pk_set)
+
+
+PRODUCT_SEARCH_CONFIG = 'simple'
+
+
+def get_product_search_vector():
+    category_names = Category.objects.filter(
+        product=OuterRef('pk')).order_by().values('product').annotate(
+            names=StringAgg('name', ' ')).values('names')
+    option_names = VariationOption.objects.filter(
+        variations__product=OuterRef('pk')).order_by().values(
+            'variations__product').annotate(names=StringAgg(
+                'name', ' ', distinct=True)).values('names')
+    return (
+        SearchVector('name', weight='A', config=PRODUCT_SEARCH_CONFIG)
+        + SearchVector(Subquery(category_names, output_field=TextField()),
+                       weight='B',
+                       config=PRODUCT_SEARCH_CONFIG)
+        + SearchVector(Subquery(option_names, output_field=TextField()),
+                       weight='C',
+                       config=PRODUCT_SEARCH_CONFIG)
+        + SearchVector('description',
+                       weight='D',
+                       config=PRODUCT_SEARCH_CONFIG))
+
+
+def refresh_search_vectors(product_ids):
+    product_ids = set(product_ids)
+
+    def refresh():
+        Product.objects.filter(id__in=product_ids).update(
+            search_vector=get_product_search_vector())
+
+    if product_ids:
+        transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Product)
+def handle_search_vector_product_change(sender, instance, *args, **kwargs):
+    refresh_search_vectors([instance.id])
+
+
+@receiver(post_delete, sender=ProductVariation)
+def handle_search_vector_variation_delete(sender, instance, *args, **kwargs):
+    refresh_search_vectors([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def handle_search_vector_categories_change(sender, instance, action,
+                                           reverse, pk_set, *args, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        refresh_search_vectors([instance.id])
+    elif pk_set:
+        refresh_search_vectors(pk_set)
+
+
+@receiver(m2m_changed,
+          sender=ProductVariation.variation_option_combination.through)
+def handle_search_vector_options_change(sender, instance, action, reverse,
+                                        pk_set, *args, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        refresh_search_vectors([instance.product_id])
+    elif pk_set:
+        refresh_search_vectors(
+            ProductVariation.objects.filter(id__in=pk_set).values_list(
+                'product_id', flat=True))
+
+
+def build_availability_matrix(product_slug):
+    options = {}
+    for option in VariationOption.objects.filter(
+            variations__product__slug=product_slug,
+            variations__is_active=True).values(
+                'id', 'name', 'variation_type__name').distinct():
+        options.setdefault(option['variation_type__name'], []).append({
+            'id': option['id'],
+            'name': option['name']
+        })
+    variations = {}
+    for variation in ProductVariation.objects.filter(
+            product__slug=product_slug, is_active=True).values(
+                'slug', 'selling_price', 'crossed_price', 'stock',
+                'combination_key',
+                'product__continue_selling_after_out_of_stock'):
+        variations[variation['combination_key'] or ''] = {
+            'slug': variation['slug'],
+            'selling_price': str(variation['selling_price']),
+            'crossed_price': str(variation['crossed_price']),
+            'in_stock': (
+                variation['stock'] > 0
+                or variation['product__continue_selling_after_out_of_stock'])
+        }
+    return {'options': options, 'variations': variations}
+
+
+def get_availability_key(product_slug):
+    # Options are grouped by type name, so renaming a type retires the key.
+    versions = get_cache_versions(['variation_type'])
+    return f'product_availability_{versions}_{product_slug}'
+
+
+def get_availability_matrix(product_slug):
+    key = get_availability_key(product_slug)
+    if (matrix := cache.get(key)) is None:
+        matrix = build_availability_matrix(product_slug)
+        cache.set(key, matrix, settings.CATALOG_CACHE_SECONDS)
+    return matrix
+
+
+def refresh_availability_matrices(product_ids):
+    product_ids = set(product_ids)
+
+    def refresh():
+        for slug in Product.objects.filter(id__in=product_ids).values_list(
+                'slug', flat=True):
+            cache.set(get_availability_key(slug),
+                      build_availability_matrix(slug),
+                      settings.CATALOG_CACHE_SECONDS)
+
+    if product_ids:
+        transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Product)
+def handle_availability_product_change(sender, instance, *args, **kwargs):
+    refresh_availability_matrices([instance.id])
+
+
+@receiver([post_save, post_delete], sender=ProductVariation)
+def handle_availability_variation_change(sender, instance, *args, **kwargs):
+    refresh_availability_matrices([instance.product_id])
+
+
+def refresh_product_read_models(product_ids):
+    invalidate_cache_namespaces('product')
+    refresh_product_cards(product_ids)
+    refresh_search_vectors(product_ids)
+    refresh_availability_matrices(product_ids)
+
+
+def queue_product_read_models_refresh(product_ids):
+    # system.tasks imports this module.
+    from system.tasks import refresh_product_read_models_task
+    product_ids = list(set(product_ids))
+    schema_name = connection.schema_name
+    if product_ids:
+        transaction.on_commit(lambda: refresh_product_read_models_task.delay(
+            schema_name, product_ids))
+
+
+# A category or an option can be shared by the whole catalog, so the products
+# they touch are refreshed by a worker instead of inside the request.
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def handle_read_models_category_change(sender, instance, *args, **kwargs):
+    queue_product_read_models_refresh(
+        instance.product_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=VariationOption)
+@receiver(pre_delete, sender=VariationOption)
+def handle_read_models_option_change(sender, instance, *args, **kwargs):
+    queue_product_read_models_refresh(
+        instance.variations.values_list('product_id', flat=True))
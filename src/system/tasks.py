@@ -0,0 +1,256 @@
+import codecs
+import csv
+from decimal import Decimal
+from itertools import islice
+
+import openpyxl
+from django.db import transaction
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat
+from django.utils.text import slugify
+from django.utils.timezone import now
+from django_tenants.utils import schema_context
+
+from core.celery import celery_app
+from core.utils.caches import invalidate_cache_namespaces
+from system.models import (CatalogImport, Category, Product, ProductVariation,
+                           VariationOption, VariationType)
+from system.models.product import (get_combination_key,
+                                   refresh_product_read_models)
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_PRICE_FIELDS = ['selling_price', 'crossed_price', 'cost_price']
+
+
+def iter_import_rows(document):
+    if document.name.lower().endswith('.xlsx'):
+        workbook = openpyxl.load_workbook(document,
+                                          read_only=True,
+                                          data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [
+            str(header or '').strip().lower() for header in next(rows, [])
+        ]
+        for row in rows:
+            if any(value not in (None, '') for value in row):
+                yield dict(zip(headers, row))
+        workbook.close()
+    else:
+        for row in csv.DictReader(codecs.iterdecode(document, 'utf-8-sig')):
+            if any(value not in (None, '') for value in row.values()):
+                yield {
+                    str(key).strip().lower(): value
+                    for key, value in row.items()
+                }
+
+
+def split_import_values(value):
+    return [
+        item.strip() for item in str(value or '').split('|') if item.strip()
+    ]
+
+
+def parse_import_row(row):
+    name = str(row.get('product_name') or '').strip()
+    if not name:
+        raise ValueError('product_name is required.')
+    options = []
+    for option in split_import_values(row.get('options')):
+        if ':' not in option:
+            raise ValueError(
+                f'Option "{option}" must be given as "type:option".')
+        variation_type, option_name = option.split(':', 1)
+        options.append((variation_type.strip(), option_name.strip()))
+    stock = int(Decimal(str(row.get('stock') or 0)))
+    if stock < 0:
+        raise ValueError('stock cannot be negative.')
+    data = {
+        'name': name.title(),
+        'description': str(row.get('description') or ''),
+        'categories': split_import_values(row.get('categories')),
+        'options': options,
+        'sku': str(row.get('sku') or '').strip(),
+        'stock': stock,
+    }
+    for field in IMPORT_PRICE_FIELDS:
+        data[field] = Decimal(str(row.get(field) or 0))
+    return data
+
+
+def import_catalog_chunk(rows):
+    category_names = {name for row in rows for name in row['categories']}
+    Category.objects.bulk_create(
+        [Category(name=name, slug=slugify(name)) for name in category_names],
+        ignore_conflicts=True)
+    Category.objects.filter(name__in=category_names, path='').update(
+        path=Concat(Cast('id', CharField()), Value('/')))
+    categories = dict(
+        Category.objects.filter(name__in=category_names).values_list(
+            'name', 'id'))
+
+    type_names = {name for row in rows for name, _ in row['options']}
+    VariationType.objects.bulk_create(
+        [VariationType(name=name) for name in type_names],
+        ignore_conflicts=True)
+    types = dict(
+        VariationType.objects.filter(name__in=type_names).values_list(
+            'name', 'id'))
+    options = {
+        (type_id, name): option_id
+        for type_id, name, option_id in VariationOption.objects.filter(
+            variation_type_id__in=types.values()).values_list(
+                'variation_type_id', 'name', 'id')
+    }
+    missing_options = {(types[type_name], name)
+                       for row in rows
+                       for type_name, name in row['options']} - set(options)
+    for option in VariationOption.objects.bulk_create([
+            VariationOption(variation_type_id=type_id, name=name)
+            for type_id, name in missing_options
+    ]):
+        options[(option.variation_type_id, option.name)] = option.id
+
+    products = {}
+    for row in rows:
+        products.setdefault(
+            row['name'],
+            Product(name=row['name'],
+                    slug=slugify(row['name']),
+                    description=row['description']))
+    Product.objects.bulk_create(products.values(),
+                                update_conflicts=True,
+                                unique_fields=['name'],
+                                update_fields=['description', 'updated_at'])
+
+    product_categories = Product.categories.through
+    product_categories.objects.bulk_create([
+        product_categories(product_id=products[row['name']].id,
+                           category_id=categories[name])
+        for row in rows for name in row['categories']
+    ], ignore_conflicts=True)
+    product_types = Product.enabled_variation_types.through
+    product_types.objects.bulk_create([
+        product_types(product_id=products[row['name']].id,
+                      variationtype_id=types[type_name])
+        for row in rows for type_name, _ in row['options']
+    ], ignore_conflicts=True)
+
+    variations = {}
+    for row in rows:
+        product = products[row['name']]
+        option_ids = [
+            options[(types[type_name], name)]
+            for type_name, name in row['options']
+        ]
+        names = ' '.join(name for _, name in row['options'])
+        slug = slugify(f"{product.name}-{names or row['sku'] or 'default'}")
+        combination_key = get_combination_key(option_ids)
+        key = (product.name, combination_key) if option_ids else slug
+        variations[key] = (ProductVariation(
+            product=product,
+            slug=slug,
+            combination_key=combination_key,
+            sku=row['sku'],
+            stock=row['stock'],
+            **{field: row[field]
+               for field in IMPORT_PRICE_FIELDS}), option_ids)
+    update_fields = ['sku', 'stock', *IMPORT_PRICE_FIELDS, 'updated_at']
+    ProductVariation.objects.bulk_create(
+        [v for v, option_ids in variations.values() if option_ids],
+        update_conflicts=True,
+        unique_fields=['product', 'combination_key'],
+        update_fields=update_fields)
+    # Variations without options have no combination key; reuse the one a
+    # product already has with the same sku, or its blank sku default
+    # variation, instead of inserting a second one next to it.
+    simple = [v for v, option_ids in variations.values() if not option_ids]
+    existing = {}
+    for variation_id, product_id, sku in ProductVariation.objects.filter(
+            product_id__in={v.product.id for v in simple},
+            combination_key=None).order_by('id').values_list(
+                'id', 'product_id', 'sku'):
+        existing.setdefault((product_id, sku), variation_id)
+    matched, unmatched = [], []
+    for variation in simple:
+        variation_id = (existing.pop((variation.product.id, variation.sku),
+                                     None)
+                        or existing.pop((variation.product.id, ''), None))
+        if variation_id is None:
+            unmatched.append(variation)
+            continue
+        variation.pk = variation_id
+        variation.updated_at = now()
+        matched.append(variation)
+    ProductVariation.objects.bulk_update(matched, update_fields)
+    ProductVariation.objects.bulk_create(unmatched,
+                                         update_conflicts=True,
+                                         unique_fields=['slug'],
+                                         update_fields=update_fields)
+
+    variation_options = ProductVariation.variation_option_combination.through
+    variation_options.objects.bulk_create([
+        variation_options(productvariation_id=variation.id,
+                          variationoption_id=option_id)
+        for variation, option_ids in variations.values()
+        for option_id in option_ids
+    ], ignore_conflicts=True)
+
+    product_ids = [product.id for product in products.values()]
+    Product.objects.filter(id__in=product_ids, default_variant=None).update(
+        default_variant=Subquery(
+            ProductVariation.objects.filter(
+                product=OuterRef('pk')).order_by('id').values('id')[:1]))
+    # Categories and variation types were written in bulk, without the
+    # receivers that version their cached responses.
+    invalidate_cache_namespaces('category', 'variation_type')
+    refresh_product_read_models(product_ids)
+
+
+@celery_app.task
+def import_catalog_task(schema_name, import_id):
+    with schema_context(schema_name):
+        job = CatalogImport.objects.get(id=import_id)
+        job.status = 'processing'
+        job.save()
+        errors = []
+        processed = imported = 0
+        try:
+            with job.document.open('rb') as document:
+                rows = iter_import_rows(document)
+                while chunk := list(islice(rows, IMPORT_CHUNK_SIZE)):
+                    first_row = processed + 2
+                    parsed = []
+                    for number, row in enumerate(chunk, start=first_row):
+                        try:
+                            parsed.append(parse_import_row(row))
+                        except (ValueError, ArithmeticError) as exp:
+                            errors.append({'row': number, 'error': f'{exp}'})
+                    last_row = first_row + len(chunk) - 1
+                    try:
+                        with transaction.atomic():
+                            import_catalog_chunk(parsed)
+                        imported += len(parsed)
+                    except Exception as exp:
+                        errors.append({
+                            'rows': f'{first_row}-{last_row}',
+                            'error': f'{exp.__class__.__name__}: {exp}'
+                        })
+                    processed += len(chunk)
+                    CatalogImport.objects.filter(id=job.id).update(
+                        processed_rows=processed,
+                        imported_rows=imported,
+                        errors=errors)
+            job.status = 'done'
+        except Exception as exp:
+            errors.append({'error': f'{exp.__class__.__name__}: {exp}'})
+            job.status = 'failed'
+        job.processed_rows = processed
+        job.imported_rows = imported
+        job.errors = errors
+        job.save()
+
+
+@celery_app.task
+def refresh_product_read_models_task(schema_name, product_ids):
+    with schema_context(schema_name):
+        refresh_product_read_models(product_ids)
@@ -0,0 +1,70 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from system.api.products import ProductAPI
+from system.models import (Category, Product, ProductVariation, VariationOption,
+                           VariationType)
+from users.models import UserBase
+
+
+# Responses must be rendered on every request, not replayed from the cache.
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+    }
+})
+class ProductListQueryTest(TenantTestCase):
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.name = 'test'
+        tenant.type = 'system'
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Shoes')
+        self.size = VariationType.objects.create(name='Size')
+        self.option = VariationOption.objects.create(name='Large',
+                                                     variation_type=self.size)
+        self.staff = UserBase.objects.create(email='staff@test.com',
+                                             is_staff=True)
+
+    def create_products(self, count):
+        for _ in range(count):
+            product = Product.objects.create(
+                name=f'Product {Product.objects.count()}')
+            product.categories.add(self.category)
+            product.enabled_variation_types.add(self.size)
+            variation = ProductVariation.objects.create(product=product,
+                                                        stock=5)
+            variation.variation_option_combination.add(self.option)
+            product.default_variant = variation
+            product.save()
+
+    def list_products(self, user=None):
+        request = APIRequestFactory().get('/products/', {'size': 20})
+        if user is not None:
+            force_authenticate(request, user=user)
+        response = ProductAPI.as_view({'get': 'list'})(request)
+        response.render()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assert_constant_queries(self, user=None):
+        self.create_products(1)
+        # Warm up per-process caches so they do not skew the baseline.
+        self.list_products(user)
+        with CaptureQueriesContext(connection) as single_page:
+            self.list_products(user)
+        self.create_products(19)
+        with self.assertNumQueries(len(single_page)):
+            response = self.list_products(user)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_list_queries_do_not_grow_with_products(self):
+        self.assert_constant_queries()
+
+    def test_staff_list_queries_do_not_grow_with_products(self):
+        self.assert_constant_queries(self.staff)
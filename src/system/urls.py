@@ -2,19 +2,25 @@ from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 from rest_framework_nested import routers
 
-from system.api.products import (CategoryAPI, ProductAPI, ProductImageAPI,
+from system.api.products import (CategoryAPI, ProductAPI, ProductCardAPI,
+                              ProductImageAPI,
                               ProductVariationAPI,
-                              VariationOptionAPI, VariationTypeAPI)
+                              VariationOptionAPI, VariationTypeAPI,
+                              catalog_cache_stats, media_queue_stats)
+from system.api.imports import CatalogImportAPI
+from system.api.inventory import variation_bulk_update
 from system.api.orders import OrderAPI, OrderItemStatusAPI, OrderStatusAPI
 
 router = SimpleRouter()
 router.register('categories', CategoryAPI)
 
 router.register('products', ProductAPI)
+router.register('product-cards', ProductCardAPI)
 
 router.register('status/order', OrderStatusAPI)
 router.register('status/order-items', OrderItemStatusAPI)
 router.register('orders', OrderAPI)
+router.register('imports', CatalogImportAPI)
 
 product_router = routers.NestedSimpleRouter(router,
                                             r'products',
@@ -30,6 +36,9 @@ variation_type_router = routers.NestedSimpleRouter(
 variation_type_router.register('options', VariationOptionAPI)
 
 urlpatterns = [
+    path('catalog-cache-stats/', catalog_cache_stats),
+    path('media-queue-stats/', media_queue_stats),
+    path('variations/bulk-update/', variation_bulk_update),
     path('', include(router.urls)),
     path('', include(product_router.urls)),
     path('', include(variation_type_router.urls)),